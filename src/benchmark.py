@@ -0,0 +1,491 @@
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from itertools import count
+
+from collision import CollisionGrid, brute_force_first_collision
+from lanes import progress
+from main import Game
+from vehicle_store import np
+from screens import PlayScreen
+from world import World
+from batch import build_configs, run_batch
+from parallel import ParallelWorld
+from vehicles import Car, Ambulance, PoliceCar, DIRECTIONS, DIR_CODE
+
+
+def _timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def spread_vehicles(count, spacing=50, seed=0):
+    rng = random.Random(seed)
+    cols = math.ceil(math.sqrt(count))
+    vehicles = []
+    for i in range(count):
+        row, col = divmod(i, cols)
+        x = col * spacing + spacing / 2
+        y = row * spacing + spacing / 2
+        vehicles.append(Car(x, y, rng.choice(DIRECTIONS)))
+    size = cols * spacing
+    return vehicles, (0, 0, size, size)
+
+
+def bench_collisions(counts=(10, 25, 50, 100, 200, 400), repeat=20):
+    print("crash detection, no collisions (worst case)")
+    print(f"{'vehicles':>9} {'pairwise ms':>12} {'grid ms':>9} {'speedup':>8}")
+
+    for n in counts:
+        vehicles, bounds = spread_vehicles(n)
+        grid = CollisionGrid(bounds)
+
+        assert grid.first_collision(vehicles) is None
+        assert brute_force_first_collision(vehicles, bounds) is None
+
+        brute = _timeit(lambda: brute_force_first_collision(vehicles, bounds), repeat)
+        fast = _timeit(lambda: grid.first_collision(vehicles), repeat)
+        print(f"{n:>9} {brute * 1000:>12.3f} {fast * 1000:>9.3f} {brute / fast:>7.1f}x")
+
+
+def populate(game, count, seed=0, margin=40):
+    # scatter vehicles along the allowed arms, clear of the intersection box
+    # so the first frames are not all crashes, and register them with the
+    # game (store and lanes) the way spawn_vehicle does, front of each lane
+    # first so the lane queues stay in order
+    rng = random.Random(seed)
+    directions = game.road.allowed_directions()
+    left, top, width, height = game.road.intersection_rect()
+
+    vehicles = []
+    for _ in range(count):
+        v = game.factory.create(rng.choice(directions), game)
+        reach = margin + v.SIZE[1]
+        if v.direction in ("N", "S"):
+            lo, hi, extent = top - reach, top + height + reach, game.HEIGHT
+        else:
+            lo, hi, extent = left - reach, left + width + reach, game.WIDTH
+        coord = rng.uniform(0, extent - (hi - lo))
+        if coord >= lo:
+            coord += hi - lo
+        if v.direction in ("N", "S"):
+            v.y = coord
+        else:
+            v.x = coord
+        vehicles.append(v)
+
+    vehicles.sort(key=lambda v: progress(v, v.direction), reverse=True)
+    for v in vehicles:
+        game.add_vehicle(v)
+    return game.vehicles
+
+
+def bench_engines(counts=(10, 100, 1000, 5000), frames=20):
+    if np is None:
+        print("engines: numpy is not installed, skipping")
+        return
+
+    print(f"full update_playing frame, {frames} frames (per-object vs numpy store)")
+    print(f"{'vehicles':>9} {'object ms':>10} {'numpy ms':>9} {'speedup':>8}")
+
+    for n in counts:
+        times = []
+        for engine in ("object", "numpy"):
+            game = Game("cross", headless=True, engine=engine, seed=n)
+            game.WIN_TIME = float("inf")
+            game.JAM_THRESHOLD = 10 ** 9
+            # a crash still runs the collision pass; it just doesn't end the run
+            game.end_round = lambda outcome: None
+            populate(game, n)
+            times.append(_timeit(lambda: game.update_playing(game.sim_dt), frames))
+        obj, vec = times
+        print(f"{n:>9} {obj * 1000:>10.3f} {vec * 1000:>9.3f} {obj / vec:>7.1f}x")
+
+
+def _frame_times(game, frames, dt):
+    times = []
+    for _ in range(frames):
+        game.advance(dt)
+        start = time.perf_counter()
+        game.draw()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times
+
+
+def bench_rendering(frames=600, seed=1):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    dt = 1 / Game.FPS
+
+    print(f"play screen frame time over {frames} frames (draw + display update)")
+    print(f"{'renderer':>11} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7}")
+
+    for label, dirty in (("full", False), ("dirty-rect", True)):
+        game = Game("cross", dirty_rects=dirty, seed=seed)
+        game.WIN_TIME = float("inf")
+        game.JAM_THRESHOLD = 10 ** 9
+        game.collisions.first_collision = lambda vehicles, rects=None: None
+        game.set_screen(PlayScreen())
+
+        times = _frame_times(game, frames, dt)
+        mean = sum(times) / len(times)
+        p50 = times[len(times) // 2]
+        p95 = times[int(len(times) * 0.95)]
+        print(f"{label:>11} {mean * 1000:>8.3f} {p50 * 1000:>7.3f} {p95 * 1000:>7.3f}")
+
+
+def bench_sprites(counts=(100, 300, 1000), frames=200, seed=2):
+    import pygame
+    from render import draw_road, draw_vehicles
+
+    print(f"vehicle drawing, {frames} frames offscreen")
+    print(f"{'vehicles':>9} {'draw.rect ms':>13} {'atlas ms':>9} {'speedup':>8}")
+
+    for n in counts:
+        game = Game("cross", headless=True, seed=seed)
+        vehicles = populate(game, n, seed)
+        screen = pygame.Surface((game.WIDTH, game.HEIGHT))
+        draw_road(screen, game.road)
+
+        def per_vehicle():
+            for v in vehicles:
+                pygame.draw.rect(screen, v.COLOR, v.draw_rect(), border_radius=4)
+
+        draw_vehicles(screen, vehicles)
+        rects = _timeit(per_vehicle, frames)
+        atlas = _timeit(lambda: draw_vehicles(screen, vehicles), frames)
+        print(f"{n:>9} {rects * 1000:>13.3f} {atlas * 1000:>9.3f} {rects / atlas:>7.1f}x")
+
+
+class DictVehicle:
+    """The pre-__slots__ vehicle layout, kept for the memory comparison."""
+
+    priority = False
+    _uids = count(1)
+
+    # same attributes as Vehicle.__slots__, only the storage differs
+    def __init__(self, x, y, direction):
+        self.uid = next(self._uids)
+        self.x = float(x)
+        self.y = float(y)
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.dir = DIR_CODE[direction]
+        self.alive = True
+        self._waits = None
+        self.blocked = False
+        self.passed_stop = False
+        self._should_stop_cached = False
+        self.yielding = False
+        self.turned = False
+        self.turn_target_dir = None
+        self.turn_triggered = False
+
+
+def bytes_per_vehicle(cls, count):
+    rng = random.Random(0)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    vehicles = [cls(rng.uniform(0, 900), rng.uniform(0, 700), rng.choice(DIRECTIONS))
+                for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    used = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del vehicles
+    return used / count
+
+
+def bench_memory(count=10000, frames=3600, seed=3):
+    print(f"memory per vehicle ({count} live instances, tracemalloc)")
+    print(f"{'layout':>10} {'bytes':>8}")
+    legacy = bytes_per_vehicle(DictVehicle, count)
+    slotted = bytes_per_vehicle(Car, count)
+    print(f"{'__dict__':>10} {legacy:>8.0f}")
+    ratio = legacy / slotted
+    if ratio >= 1:
+        change = f"{ratio:.1f}x smaller"
+    else:
+        change = f"{1 / ratio:.1f}x larger"
+    print(f"{'__slots__':>10} {slotted:>8.0f}   ({change})")
+
+    game = Game("cross", headless=True, seed=seed)
+    game.WIN_TIME = float("inf")
+    game.JAM_THRESHOLD = 10 ** 9
+    game.spawn_interval = 0.1
+    game.collisions.first_collision = lambda vehicles, rects=None: None
+
+    live, distinct, spawned = set(), set(), 0
+    for _ in range(frames):
+        game.update_playing(game.sim_dt)
+        current = set(game.vehicles)
+        spawned += len(current - live)
+        distinct |= current
+        live = current
+
+    print(f"soak run: {frames} steps, {spawned} spawns served by {len(distinct)} vehicle objects")
+
+
+def bench_world(sizes=(2, 5, 10, 20), warmup=10.0, seconds=2.0, seed=5):
+    dt = 1 / Game.SIM_HZ
+    print(f"grid world throughput ({warmup:.0f}s warm-up, {seconds:.0f}s measured)")
+    print(f"{'grid':>7} {'cells':>6} {'vehicles':>9} {'ms/step':>8} {'veh upd/s':>10} {'x real':>7}")
+
+    for n in sizes:
+        world = World(n, n, seed=seed, spawn_interval=0.3)
+        for _ in range(round(warmup / dt)):
+            world.step(dt)
+        stats = world.run(seconds, dt)
+        print(f"{n:>3}x{n:<3} {stats['cells']:>6} {stats['vehicles']:>9} "
+              f"{stats['wall_time'] / stats['steps'] * 1000:>8.3f} "
+              f"{stats['vehicle_steps_per_sec']:>10.0f} {stats['speedup']:>7.2f}")
+
+
+def bench_parallel(size=12, warmup=10.0, seconds=2.0, seed=5, max_workers=None):
+    dt = 1 / Game.SIM_HZ
+    max_workers = max_workers or max(2, os.cpu_count() or 1)
+    print(f"{size}x{size} grid stepped across worker processes "
+          f"({os.cpu_count()} CPUs, {warmup:.0f}s warm-up, {seconds:.0f}s measured)")
+    print(f"{'workers':>8} {'ms/step':>8} {'veh upd/s':>10} {'speedup':>8}")
+
+    world = World(size, size, seed=seed, spawn_interval=0.3)
+    for _ in range(round(warmup / dt)):
+        world.step(dt)
+    serial = world.run(seconds, dt)
+    base = serial["wall_time"]
+    print(f"{'serial':>8} {base / serial['steps'] * 1000:>8.3f} "
+          f"{serial['vehicle_steps_per_sec']:>10.0f} {1.0:>7.2f}x")
+
+    for workers in range(1, max_workers + 1):
+        with ParallelWorld(size, size, seed=seed, spawn_interval=0.3, workers=workers) as pw:
+            for _ in range(round(warmup / dt)):
+                pw.step(dt)
+            stats = pw.run(seconds, dt)
+        assert stats["vehicles"] == serial["vehicles"], "parallel run diverged"
+        print(f"{workers:>8} {stats['wall_time'] / stats['steps'] * 1000:>8.3f} "
+              f"{stats['vehicle_steps_per_sec']:>10.0f} {base / stats['wall_time']:>7.2f}x")
+
+
+def bench_controllers(spawn_probs=(0.6, 0.8, 0.9, 1.0), rounds=200, seed=100):
+    print(f"signal strategies, cross template, spawn every 0.5s, {rounds} rounds per cell")
+    print(f"{'controller':>13} {'spawn_prob':>10} {'jam rate':>9} {'crash rate':>11} "
+          f"{'win rate':>9} {'mean survived':>14}")
+
+    configs = build_configs(["cross"], [4.0], [1.5], [1.0], [0.5], spawn_probs, rounds, seed,
+                            controllers=("fixed", "max-pressure"))
+    for config in configs:
+        # same seeds for both strategies so they face identical arrivals
+        config["seed"] = seed + spawn_probs.index(config["spawn_prob"])
+
+    for r in run_batch(configs):
+        print(f"{r['controller']:>13} {r['spawn_prob']:>10.2f} {r['jam_rate']:>9.3f} "
+              f"{r['crash_rate']:>11.3f} {r['win_rate']:>9.3f} {r['mean_survived']:>13.2f}s")
+
+    seconds = 90
+    dt = 1 / Game.SIM_HZ
+    print(f"\n1x4 corridor, {seconds}s, spawn_prob 0.9 (rounds never end here)")
+    print(f"{'controller':>13} {'interval':>9} {'exited':>7} {'backlog':>8} {'mean waiting':>13}")
+    for controller in ("fixed", "max-pressure"):
+        for interval in (0.5, 0.35):
+            world = World(1, 4, seed=3, spawn_interval=interval, spawn_prob=0.9,
+                          controller=controller)
+            samples = []
+            for i in range(round(seconds / dt)):
+                world.step(dt)
+                if i % 12 == 0:
+                    samples.append(sum(cell.lanes.waits.count for cell in world.cells))
+            stats = world.stats()
+            print(f"{controller:>13} {interval:>9.2f} {stats['exited']:>7} {stats['vehicles']:>8} "
+                  f"{sum(samples) / len(samples):>13.1f}")
+
+
+SCENARIOS = {
+    "cross_10": ("cross", 10, None),
+    "cross_100": ("cross", 100, None),
+    "cross_1000": ("cross", 1000, None),
+    "cross_10000": ("cross", 10000, None),
+    "emergency_heavy": ("cross", 400, 0.5),
+    "t_turns": ("t", 400, None),
+}
+
+LANE_SPACING = 50
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def build_scenario(template, count, priority_ratio=None, seed=0):
+    directions = ("S", "W", "E") if template == "t" else DIRECTIONS
+    per_lane = math.ceil(count / len(directions))
+    half = max(450, per_lane * LANE_SPACING + 400)
+
+    stress_game = type("StressGame", (Game,), {"WIDTH": 2 * half, "HEIGHT": 2 * half})
+    game = stress_game(template, headless=True, seed=seed)
+    game.WIN_TIME = float("inf")
+    game.JAM_THRESHOLD = 10 ** 9
+    game.spawn_prob = 0.0
+
+    road = game.road
+    cx, cy = road.center_x, road.center_y
+    start = road.stop_offset + 40
+    rng = random.Random(seed)
+
+    for i in range(count):
+        direction = directions[i % len(directions)]
+        back = start + (i // len(directions)) * LANE_SPACING
+
+        if priority_ratio is None:
+            v = game.factory.create(direction, game)
+        else:
+            r = rng.random()
+            cls = Car if r >= priority_ratio else (Ambulance if r < priority_ratio / 2 else PoliceCar)
+            v = cls(0, 0, direction)
+
+        if direction == "N":
+            v.y = cy - back
+        elif direction == "S":
+            v.y = cy + back
+        elif direction == "W":
+            v.x = cx - back
+        else:
+            v.x = cx + back
+        if direction in ("N", "S"):
+            v.x = cx - road.lane_width / 2 if direction == "N" else cx + road.lane_width / 2
+        else:
+            v.y = cy + road.lane_width / 2 if direction == "W" else cy - road.lane_width / 2
+
+        game.vehicles.append(v)
+        game.lanes.add(v)
+
+    return game
+
+
+def _per_frame(fn, frames):
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def measure_scenario(template, count, priority_ratio=None, frames=None, seed=0):
+    frames = frames or max(3, min(30, 30000 // count))
+    results = {}
+
+    game = build_scenario(template, count, priority_ratio, seed)
+    dt = game.sim_dt
+    results["update_playing"] = _per_frame(lambda: game.update_playing(dt), frames)
+    assert not game.game_over, "stress scenario ended early"
+
+    game = build_scenario(template, count, priority_ratio, seed)
+
+    def vehicle_updates():
+        for v in game.vehicles:
+            v.update(dt, game)
+
+    results["vehicle_update"] = _per_frame(vehicle_updates, frames)
+
+    game = build_scenario(template, count, priority_ratio, seed)
+    plain = [v for v in game.vehicles if not v.priority]
+
+    def yield_checks():
+        for v in plain:
+            v._should_yield(game)
+
+    results["should_yield"] = _per_frame(yield_checks, frames)
+    results["crash_detection"] = _per_frame(
+        lambda: game.collisions.first_collision(game.vehicles), frames)
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold):
+    regressions = []
+    for scenario, metrics in results.items():
+        for metric, ms in metrics.items():
+            before = baseline.get(scenario, {}).get(metric)
+            if before and ms > before * (1 + threshold):
+                regressions.append((scenario, metric, before, ms))
+    return regressions
+
+
+def bench_suite(scenarios=None, baseline_path=None, save_path=None, threshold=0.25):
+    names = scenarios or list(SCENARIOS)
+    metrics = ("update_playing", "vehicle_update", "should_yield", "crash_detection")
+
+    print("stress scenarios, median ms per frame")
+    print(f"{'scenario':>16}" + "".join(f"{m:>17}" for m in metrics))
+
+    results = {}
+    for name in names:
+        results[name] = measure_scenario(*SCENARIOS[name])
+        print(f"{name:>16}" + "".join(f"{results[name][m]:>17.3f}" for m in metrics))
+
+    if save_path:
+        with open(save_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {save_path}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, threshold)
+        for scenario, metric, before, after in regressions:
+            print(f"REGRESSION {scenario}.{metric}: {before:.3f} -> {after:.3f} ms "
+                  f"(+{(after / before - 1) * 100:.0f}%)")
+        if not regressions:
+            print(f"no regressions beyond {threshold * 100:.0f}% against {baseline_path}")
+        return results, regressions
+
+    return results, []
+
+
+BENCHMARKS = {
+    "collisions": bench_collisions,
+    "engines": bench_engines,
+    "rendering": bench_rendering,
+    "sprites": bench_sprites,
+    "memory": bench_memory,
+    "world": bench_world,
+    "parallel": bench_parallel,
+    "controllers": bench_controllers,
+    "suite": bench_suite,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulation hot path benchmarks")
+    parser.add_argument("names", nargs="*",
+                        help="benchmarks to run: " + ", ".join(sorted(BENCHMARKS)))
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="suite: only run these scenarios (repeatable)")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, default=None,
+                        metavar="PATH", help="suite: store results as the new baseline")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE_PATH, default=None,
+                        metavar="PATH",
+                        help="suite: compare against a stored baseline (default "
+                             "src/benchmark_baseline.json, created by --save-baseline and "
+                             "gitignored)")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="suite: allowed slowdown before flagging a regression (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    unknown = [n for n in args.names if n not in BENCHMARKS]
+    if unknown:
+        parser.error("unknown benchmark: " + ", ".join(unknown))
+
+    failed = False
+    for name in args.names or sorted(BENCHMARKS):
+        if name == "suite":
+            _, regressions = bench_suite(args.scenario, args.baseline, args.save_baseline,
+                                         args.threshold)
+            failed = failed or bool(regressions)
+        else:
+            BENCHMARKS[name]()
+    sys.exit(1 if failed else 0)
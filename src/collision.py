@@ -0,0 +1,93 @@
+def overlaps(a, b):
+    # a and b are (left, top, width, height); same rule as pygame's colliderect
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+class CollisionGrid:
+    CELL_SIZE = 64
+    MARGIN = 40
+
+    def __init__(self, bounds, cell_size=CELL_SIZE, margin=MARGIN):
+        left, top, width, height = bounds
+        self.bounds = (left, top, width, height)
+        self.cell_size = cell_size
+
+        self.origin_x = left - margin
+        self.origin_y = top - margin
+        self.cols = (width + 2 * margin) // cell_size + 1
+        self.rows = (height + 2 * margin) // cell_size + 1
+
+        self.cells = [[] for _ in range(self.cols * self.rows)]
+        self._used = []
+        self._entries = []
+
+    def _cell_span(self, r):
+        left, top, width, height = r
+        cs = self.cell_size
+        c0 = max(0, (left - self.origin_x) // cs)
+        c1 = min(self.cols - 1, (left + width - 1 - self.origin_x) // cs)
+        r0 = max(0, (top - self.origin_y) // cs)
+        r1 = min(self.rows - 1, (top + height - 1 - self.origin_y) // cs)
+        return [row * self.cols + col
+                for row in range(r0, r1 + 1)
+                for col in range(c0, c1 + 1)]
+
+    def _fill(self, vehicles, rects):
+        cells = self.cells
+        for c in self._used:
+            cells[c].clear()
+        self._used.clear()
+        self._entries.clear()
+
+        bounds = self.bounds
+        for v, r in zip(vehicles, rects):
+            if not overlaps(r, bounds):
+                continue
+
+            i = len(self._entries)
+            span = self._cell_span(r)
+            self._entries.append((v, r, span))
+            for c in span:
+                bucket = cells[c]
+                if not bucket:
+                    self._used.append(c)
+                bucket.append(i)
+
+    def first_collision(self, vehicles, rects=None):
+        # rects: the vehicles' rect() tuples, when the caller has them already
+        if rects is None:
+            rects = [v.rect() for v in vehicles]
+        self._fill(vehicles, rects)
+
+        cells = self.cells
+        entries = self._entries
+        for i, (a, ra, span) in enumerate(entries):
+            best = None
+            for c in span:
+                for j in cells[c]:
+                    if j <= i:
+                        continue
+                    if best is not None and j >= best:
+                        break
+                    if overlaps(ra, entries[j][1]):
+                        best = j
+                        break
+            if best is not None:
+                return a, entries[best][0]
+
+        return None
+
+
+def brute_force_first_collision(vehicles, bounds):
+    inside = [v for v in vehicles if overlaps(v.rect(), bounds)]
+
+    for i in range(len(inside)):
+        for j in range(i + 1, len(inside)):
+            a = inside[i]
+            b = inside[j]
+            if overlaps(a.rect(), b.rect()):
+                return a, b
+
+    return None
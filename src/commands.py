@@ -6,6 +6,8 @@ class Command(ABC):
         pass
 
 class NextPhaseCommand(Command):
+    CODE = 1
+
     def __init__(self, controller):
         self.controller = controller
 
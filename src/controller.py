@@ -1,10 +1,147 @@
-from traffic_light import RedState, RedYellowState, GreenState, YellowState
+from abc import ABC, abstractmethod
+
+from lanes import progress
+from traffic_light import RedState, RedYellowState, GreenState, YellowState, TrafficLight
+from vehicles import DIR_CODE
+
+
+GROUP_DIRECTIONS = {"vertical": ("N", "S"), "horizontal": ("W", "E")}
+OTHER_GROUP = {"vertical": "horizontal", "horizontal": "vertical"}
+INF = float("inf")
+
+
+class ControlStrategy(ABC):
+
+    @abstractmethod
+    def should_advance(self, controller) -> bool:
+        pass
+
+    def time_to_change(self, controller) -> float:
+        # seconds before should_advance can next return True while the sensor
+        # readings stay as they are; 0 means "ask again every step"
+        return 0.0
+
+
+class FixedTimeStrategy(ControlStrategy):
+    def should_advance(self, controller):
+        return controller.timer >= controller.phase_duration()
+
+    def time_to_change(self, controller):
+        return controller.phase_duration() - controller.timer
+
+
+class MaxPressureStrategy(ControlStrategy):
+    QUEUE_WEIGHT = 2
+
+    # defaults tuned against fixed timing with `benchmark.py controllers`
+    def __init__(self, min_green=3.0, max_green=6.0, margin=0, detection=200,
+                 max_clearance=0.25):
+        self.min_green = min_green
+        self.max_green = max_green
+        self.margin = margin
+        # approach detectors cover `detection` px upstream of each stop line
+        self.detection = detection
+        # how long a red-yellow may wait past its duration for the box to clear
+        self.max_clearance = max_clearance
+
+    def pressure(self, controller, group):
+        geo = controller.geometry
+        total = 0
+        for direction in GROUP_DIRECTIONS[group]:
+            zone = None if geo is None else geo.stop_at[DIR_CODE[direction]] - self.detection
+            queued, approaching = controller.sensors.demand(direction, zone)
+            total += self.QUEUE_WEIGHT * queued + approaching
+        return total
+
+    def occupied(self, controller):
+        geo = controller.geometry
+        return geo is not None and controller.sensors.occupied(geo.exit_at)
+
+    def _clearing(self, controller):
+        # red-yellow phases hand the junction to the other group
+        return RedYellowState() in controller.phases[controller.phase_index][:2]
+
+    def _wants_switch(self, controller, green):
+        if controller.timer < self.min_green:
+            return False
+        if controller.timer >= self.max_green:
+            return True
+        served = self.pressure(controller, green)
+        waiting = self.pressure(controller, OTHER_GROUP[green])
+        return waiting > served + self.margin
+
+    def should_advance(self, controller):
+        green = controller.green_group()
+        if controller.sensors is None:
+            return controller.timer >= controller.phase_duration()
+
+        if green is None:
+            # transitions run their fixed duration; red-yellow then holds
+            # (bounded) until the box is empty
+            duration = controller.phase_duration()
+            if controller.timer < duration:
+                return False
+            return (not self._clearing(controller)
+                    or controller.timer >= duration + self.max_clearance
+                    or not self.occupied(controller))
+
+        return self._wants_switch(controller, green)
+
+    def _time_to_sensor_change(self, controller):
+        # lower bound on when a vehicle can next enter a detection zone or
+        # leave the box: everyone moving at full speed
+        geo = controller.geometry
+        if geo is None:
+            return INF
+        t = INF
+        for direction, lane in controller.sensors.lanes.items():
+            for v in lane:
+                d = v.dir
+                p = progress(v, direction)
+                if v.passed_stop:
+                    gap = geo.exit_at[d] - (p - v.SIZE[1] / 2)
+                else:
+                    gap = geo.stop_at[d] - self.detection - p
+                if gap > 0:
+                    t = min(t, gap / v.SPEED)
+        return t
+
+    def time_to_change(self, controller):
+        green = controller.green_group()
+        if controller.sensors is None:
+            return controller.phase_duration() - controller.timer
+
+        if green is None:
+            duration = controller.phase_duration()
+            if controller.timer < duration or not self._clearing(controller):
+                return duration - controller.timer
+            if self.should_advance(controller):
+                return 0.0
+            return min(self._time_to_sensor_change(controller),
+                       duration + self.max_clearance - controller.timer)
+
+        if controller.timer < self.min_green:
+            return self.min_green - controller.timer
+        if self._wants_switch(controller, green):
+            return 0.0
+        return min(self._time_to_sensor_change(controller), self.max_green - controller.timer)
+
+
+STRATEGIES = {
+    "fixed": FixedTimeStrategy,
+    "max-pressure": MaxPressureStrategy,
+}
 
 
 class IntersectionController:
-    def __init__(self, lights_vertical, lights_horizontal):
+    def __init__(self, lights_vertical, lights_horizontal, strategy=None):
         self.v_lights = lights_vertical
         self.h_lights = lights_horizontal
+        self.strategy = strategy or FixedTimeStrategy()
+        self.sensors = None
+        # road geometry for strategies that place detectors; set by for_road
+        self.geometry = None
+        self._phase_listeners = []
 
         self.phases = [
             (GreenState(), RedState(), 4.0),
@@ -18,12 +155,64 @@ class IntersectionController:
         self.phase_index = 0
         self.timer = 0.0
 
+        # per heading code (N, S, W, E): whether that approach faces a red-like light
+        self.stops = (True, True, True, True)
+        for group in (self.v_lights, self.h_lights):
+            if group:
+                group[0].add_listener(self._light_changed)
+
         self._apply_phase()
 
+    @classmethod
+    def for_road(cls, road, strategy=None):
+        cx = road.center_x
+        cy = road.center_y
+        off = road.stop_offset
+        side_offset = road.road_width // 2 + 35
+
+        a = road.arms()
+        lights = []
+
+        if a["N"]:
+            lights.append(TrafficLight(cx - side_offset, cy - off - 30, direction="vertical"))
+        if a["S"]:
+            lights.append(TrafficLight(cx + side_offset, cy + off + 30, direction="vertical"))
+        if a["W"]:
+            lights.append(TrafficLight(cx - off - 30, cy + side_offset, direction="horizontal"))
+        if a["E"]:
+            lights.append(TrafficLight(cx + off + 30, cy - side_offset, direction="horizontal"))
+
+        vertical = [l for l in lights if l.direction == "vertical"]
+        horizontal = [l for l in lights if l.direction == "horizontal"]
+        controller = cls(vertical, horizontal, strategy)
+        controller.geometry = road.geometry
+        return controller
+
+    @property
+    def lights(self):
+        return self.v_lights + self.h_lights
+
+    def set_timings(self, green, yellow, red_yellow):
+        durations = (green, yellow, red_yellow, green, yellow, red_yellow)
+        self.phases = [
+            (v_state, h_state, dur)
+            for (v_state, h_state, _), dur in zip(self.phases, durations)
+        ]
+
+    def phase_duration(self):
+        return self.phases[self.phase_index][2]
+
+    def green_group(self):
+        v_state, h_state, _ = self.phases[self.phase_index]
+        if v_state is GreenState():
+            return "vertical"
+        if h_state is GreenState():
+            return "horizontal"
+        return None
+
     def update(self, dt):
         self.timer += dt
-        _, _, dur = self.phases[self.phase_index]
-        if self.timer >= dur:
+        if self.strategy.should_advance(self):
             self.next_phase()
 
     def next_phase(self):
@@ -40,6 +229,20 @@ class IntersectionController:
         for l in self.h_lights:
             l.set_state(h_state)
 
+        for callback in self._phase_listeners:
+            callback(self)
+
+    def add_phase_listener(self, callback):
+        self._phase_listeners.append(callback)
+
+    def remove_phase_listener(self, callback):
+        self._phase_listeners.remove(callback)
+
+    def _light_changed(self, light):
+        v_stop = self.v_lights[0].state.STOPS if self.v_lights else True
+        h_stop = self.h_lights[0].state.STOPS if self.h_lights else True
+        self.stops = (v_stop, v_stop, h_stop, h_stop)
+
     def get_group_state(self, group_name: str) -> str:
         if group_name == "vertical":
             return self.v_lights[0].current_name()
@@ -0,0 +1,163 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+
+from vehicles import Ambulance, PoliceCar, VehicleFactory
+
+
+INF = float("inf")
+
+
+class DemandCurve:
+    # piecewise-linear multiplier on the arrival rate over one period of
+    # `period` seconds; points are (fraction of the period, factor)
+    def __init__(self, points, period):
+        self.points = [tuple(p) for p in points]
+        self.times = [f * period for f, _ in points]
+        self.factors = [factor for _, factor in points]
+        self.period = period
+        self.peak = max(self.factors)
+
+    def config(self):
+        return {"points": [list(p) for p in self.points], "period": self.period}
+
+    def __call__(self, t):
+        t %= self.period
+        times = self.times
+        i = bisect_right(times, t)
+        if i == 0:
+            return self.factors[0]
+        if i == len(times):
+            return self.factors[-1]
+        t0, t1 = times[i - 1], times[i]
+        f0, f1 = self.factors[i - 1], self.factors[i]
+        return f0 + (f1 - f0) * (t - t0) / (t1 - t0)
+
+    @classmethod
+    def rush_hour(cls, period):
+        # a compressed day: quiet start, morning peak, midday plateau,
+        # evening peak, quiet end
+        return cls([(0.0, 0.3), (0.2, 1.0), (0.3, 2.5), (0.45, 1.0),
+                    (0.7, 1.0), (0.8, 2.0), (0.9, 0.8), (1.0, 0.3)], period)
+
+
+CURVES = {
+    "flat": None,
+    "rush-hour": DemandCurve.rush_hour,
+}
+
+
+class DemandModel(ABC):
+    # vehicle types drawn by VehicleFactory.create, as cumulative thresholds
+    mix = VehicleFactory.MIX
+
+    @abstractmethod
+    def reset(self, game):
+        pass
+
+    @abstractmethod
+    def arrivals(self, game):
+        # (direction, count) pairs due by the round clock, game.sim_time
+        pass
+
+    @abstractmethod
+    def time_to_arrival(self, game) -> float:
+        pass
+
+    @abstractmethod
+    def config(self) -> dict:
+        # JSON-able settings, stored in replays; see demand_from_config
+        pass
+
+
+class PoissonDemand(DemandModel):
+    def __init__(self, rates, curve=None, platoon_prob=0.0, platoon_size=(2, 4),
+                 ambulance=0.08, police=0.06):
+        # rates: vehicles per second per arm, one number for every arm or a
+        # {direction: rate} dict
+        self.rates = rates
+        self.curve = curve
+        self.platoon_prob = platoon_prob
+        self.platoon_size = platoon_size
+        self.ambulance = ambulance
+        self.police = police
+        self.mix = ((ambulance, Ambulance), (ambulance + police, PoliceCar))
+        self.next_at = {}
+
+    def rate(self, direction):
+        if isinstance(self.rates, dict):
+            return self.rates.get(direction, 0.0)
+        return self.rates
+
+    def reset(self, game):
+        self.next_at = {}
+        for direction in game.road.allowed_directions():
+            self.next_at[direction] = self._next_arrival(game.rng, direction, 0.0)
+
+    def _next_arrival(self, rng, direction, t):
+        # thinning: candidates at the curve's peak rate, each kept with
+        # probability rate(t) / peak, gives a time-varying Poisson process
+        base = self.rate(direction)
+        if base <= 0:
+            return INF
+        if self.curve is None:
+            return t + rng.expovariate(base)
+
+        peak = base * self.curve.peak
+        if peak <= 0:
+            return INF
+        while True:
+            t += rng.expovariate(peak)
+            if rng.random() * peak < base * self.curve(t):
+                return t
+
+    def arrivals(self, game):
+        now = game.sim_time
+        rng = game.rng
+        due = []
+        for direction, t in self.next_at.items():
+            count = 0
+            while t <= now:
+                if self.platoon_prob and rng.random() < self.platoon_prob:
+                    count += rng.randint(*self.platoon_size)
+                else:
+                    count += 1
+                t = self._next_arrival(rng, direction, t)
+            if count:
+                self.next_at[direction] = t
+                due.append((direction, count))
+        return due
+
+    def time_to_arrival(self, game):
+        if not self.next_at:
+            return INF
+        return min(self.next_at.values()) - game.sim_time
+
+    def config(self):
+        return {
+            "model": "poisson",
+            "rates": self.rates,
+            "curve": self.curve.config() if self.curve is not None else None,
+            "platoon_prob": self.platoon_prob,
+            "platoon_size": list(self.platoon_size),
+            "ambulance": self.ambulance,
+            "police": self.police,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        curve = config["curve"]
+        if curve is not None:
+            curve = DemandCurve(curve["points"], curve["period"])
+        return cls(config["rates"], curve, config["platoon_prob"], tuple(config["platoon_size"]),
+                   config["ambulance"], config["police"])
+
+
+MODELS = {
+    "poisson": PoissonDemand,
+}
+
+
+def demand_from_config(config):
+    if config is None:
+        return None
+    return MODELS[config["model"]].from_config(config)
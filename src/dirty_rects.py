@@ -0,0 +1,85 @@
+from pygame import Rect
+
+from render import draw_light, draw_road, draw_vehicles
+from text_cache import render_text
+
+
+class DirtyRectRenderer:
+    def __init__(self):
+        self.full_redraw = True
+        self._vehicle_rects = {}
+        self._light_states = {}
+        self._hud = []
+
+    def invalidate(self):
+        self.full_redraw = True
+
+    def _remember(self, game, vehicle_rects, hud):
+        self._vehicle_rects = vehicle_rects
+        self._light_states = {light: light.state for light in game.lights}
+        self._hud = hud
+
+    def _hud_rects(self, game):
+        hud = []
+        for text, pos in game.hud_lines():
+            label = render_text(game.font, text, True, game.HUD_COLOR)
+            hud.append((text, label.get_rect(topleft=pos)))
+        return hud
+
+    def draw(self, game, screen):
+        vehicle_rects = {v: Rect(v.draw_rect(game.alpha)) for v in game.vehicles}
+        hud = self._hud_rects(game)
+
+        if self.full_redraw:
+            game.draw_playing(screen)
+            self._remember(game, vehicle_rects, hud)
+            self.full_redraw = False
+            return [screen.get_rect()]
+
+        dirty = []
+
+        previous = self._vehicle_rects
+        for v, r in vehicle_rects.items():
+            old = previous.get(v)
+            if old is None:
+                dirty.append(r)
+            elif old != r:
+                dirty.append(old.union(r))
+        for v, old in previous.items():
+            if v not in vehicle_rects:
+                dirty.append(old)
+
+        for light in game.lights:
+            if self._light_states.get(light) is not light.state:
+                dirty.append(Rect(light.rect()))
+
+        for (text, r), (old_text, old_r) in zip(hud, self._hud):
+            if text != old_text:
+                dirty.append(r.union(old_r))
+
+        self._remember(game, vehicle_rects, hud)
+
+        bounds = screen.get_rect()
+        dirty = [r.clip(bounds) for r in dirty]
+        dirty = [r for r in dirty if r.width and r.height]
+        if not dirty:
+            return dirty
+
+        vehicles = list(vehicle_rects)
+        rect_list = list(vehicle_rects.values())
+        light_rects = [light.rect() for light in game.lights]
+
+        for area in dirty:
+            screen.set_clip(area)
+            draw_road(screen, game.road, area)
+
+            for i in area.collidelistall(light_rects):
+                draw_light(screen, game.lights[i])
+            draw_vehicles(screen, [vehicles[i] for i in area.collidelistall(rect_list)],
+                          game.alpha)
+            for text, r in hud:
+                if area.colliderect(r):
+                    screen.blit(render_text(game.font, text, True, game.HUD_COLOR), r)
+
+        screen.set_clip(None)
+        return dirty
@@ -0,0 +1,176 @@
+from collections import deque
+
+from lanes import LANE_SIGN, LaneQueues, progress
+from vehicles import DIRECTIONS
+
+
+class Intersection:
+    # the per-step traffic model shared by Game and world.Cell: signals,
+    # arrivals, movement and lane bookkeeping; the round rules (collisions,
+    # jams, telemetry, hand-offs) stay with the caller
+    # free road needed behind the spawn point before a queued arrival enters
+    SPAWN_GAP = LaneQueues.MIN_GAP
+
+    store = None
+    interpolate = False
+    profiler = None
+    demand = None
+
+    def init_backlog(self):
+        # per arm, in arrival order: None for a vehicle still to be created,
+        # or a vehicle handed over from elsewhere
+        self.spawn_backlog = {d: deque() for d in DIRECTIONS}
+        self.backlog = 0
+
+    def clear_backlog(self):
+        for waiting in self.spawn_backlog.values():
+            waiting.clear()
+        self.backlog = 0
+
+    def step_traffic(self, dt):
+        prof = self.profiler
+
+        self.sim_time += dt
+        self.lanes.waits.tick(dt)
+        self.controller.update(dt)
+        if prof is not None:
+            prof.lap("controller")
+
+        self.spawn_arrivals(dt)
+        if self.backlog:
+            self.release_backlog()
+        if self.store is not None:
+            self.store.refresh_emergency(self.lanes.emergency)
+        else:
+            self.lanes.emergency.refresh()
+        if prof is not None:
+            prof.lap("spawn")
+
+        if self.interpolate:
+            if self.store is not None:
+                self.store.snapshot()
+            else:
+                for v in self.vehicles:
+                    v.prev_x = v.x
+                    v.prev_y = v.y
+
+        lanes = self.lanes
+        if self.store is not None:
+            for v, old_direction in self.store.update(dt, self):
+                lanes.move(v, old_direction)
+            leaving = self.store.cull()
+            for v in leaving:
+                lanes.remove(v)
+            self.vehicles = self.store.views
+        else:
+            for v in self.vehicles:
+                direction = v.direction
+                v.update(dt, self)
+                if v.direction != direction:
+                    lanes.move(v, direction)
+
+            alive = []
+            leaving = []
+            for v in self.vehicles:
+                if v.alive:
+                    alive.append(v)
+                else:
+                    lanes.remove(v)
+                    leaving.append(v)
+            self.vehicles = alive
+        self.retire(leaving)
+        if prof is not None:
+            prof.lap("vehicles")
+
+        if self.store is not None:
+            self.store.update_following(lanes)
+        else:
+            lanes.update_following()
+        if prof is not None:
+            prof.lap("lanes")
+        return leaving
+
+    def first_collision(self):
+        if self.store is not None:
+            return self.collisions.first_collision(*self.store.rects(self.collisions.bounds))
+        return self.collisions.first_collision(self.vehicles)
+
+    def spawn_arrivals(self, dt):
+        if self.demand is not None:
+            for direction, count in self.demand.arrivals(self):
+                self.spawn_backlog[direction].extend([None] * count)
+                self.backlog += count
+            return
+
+        entries = self.entries
+        if not entries:
+            return
+        self.spawn_timer += dt
+        if self.spawn_timer >= self.spawn_interval:
+            self.spawn_timer = 0.0
+            if self.rng.random() < self.spawn_prob:
+                self.spawn_vehicle(self.rng.choice(entries))
+
+    def retire(self, vehicles):
+        # vehicles that drove off the road this step
+        pass
+
+    def add_vehicle(self, v):
+        # returns the vehicle as the simulation holds it: `v` itself, or its
+        # view when the numpy store is in use
+        if self.store is not None:
+            view = self.store.add(v)
+            self.factory.release(v)
+            v = view
+        else:
+            self.vehicles.append(v)
+        self.lanes.add(v)
+        return v
+
+    def spawn_vehicle(self, direction):
+        mix = self.demand.mix if self.demand is not None else None
+        return self.add_vehicle(self.factory.create(direction, self, mix))
+
+    def spawn_many(self, direction, count):
+        # queue `count` arrivals on one arm; they enter one at a time as the
+        # spawn point clears, so a burst never stacks vehicles on each other
+        self.spawn_backlog[direction].extend([None] * count)
+        self.backlog += count
+        self.release_backlog()
+
+    def enter(self, vehicle):
+        # a vehicle arriving from elsewhere queues with the arm's arrivals
+        self.spawn_backlog[vehicle.direction].append(vehicle)
+        self.backlog += 1
+        self.release_backlog()
+
+    def entry_gap(self, direction):
+        # distance from the spawn point to the rearmost vehicle of the lane
+        lane = self.lanes.lanes[direction]
+        if not lane:
+            return float("inf")
+        x, y = self.road.geometry.spawn[direction]
+        coord = y if direction in ("N", "S") else x
+        return progress(lane[-1], direction) - LANE_SIGN[direction] * coord
+
+    def held_backlog(self):
+        # queued arrivals on arms whose rearmost vehicle is waiting inside the
+        # entry gap; arrivals behind a moving lane are only delayed, not held
+        held = 0
+        for direction, waiting in self.spawn_backlog.items():
+            if (waiting and self.entry_gap(direction) < self.SPAWN_GAP
+                    and self.lanes.lanes[direction][-1].is_waiting()):
+                held += len(waiting)
+        return held
+
+    def release_backlog(self):
+        for direction, waiting in self.spawn_backlog.items():
+            if waiting and self.entry_gap(direction) >= self.SPAWN_GAP:
+                vehicle = waiting.popleft()
+                self.backlog -= 1
+                if vehicle is None:
+                    self.spawn_vehicle(direction)
+                else:
+                    x, y = self.road.geometry.spawn[direction]
+                    vehicle.__init__(x, y, direction)
+                    self.add_vehicle(vehicle)
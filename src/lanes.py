@@ -0,0 +1,238 @@
+from bisect import bisect_right, insort
+from collections import deque
+from itertools import islice
+
+from vehicles import DIRECTIONS
+
+
+LANE_SIGN = {"N": 1, "S": -1, "W": 1, "E": -1}
+
+
+def progress(vehicle, direction):
+    coord = vehicle.y if direction in ("N", "S") else vehicle.x
+    return LANE_SIGN[direction] * coord
+
+
+class EmergencyIndex:
+    def __init__(self):
+        self.lanes = {d: [] for d in DIRECTIONS}
+
+    def clear(self):
+        for lane in self.lanes.values():
+            lane.clear()
+
+    def add(self, vehicle):
+        direction = vehicle.direction
+        insort(self.lanes[direction], vehicle, key=lambda v: progress(v, direction))
+
+    def remove(self, vehicle, direction=None):
+        self.lanes[direction or vehicle.direction].remove(vehicle)
+
+    def refresh(self):
+        for direction, lane in self.lanes.items():
+            if len(lane) > 1:
+                lane.sort(key=lambda v: progress(v, direction))
+
+    def has_ahead(self, vehicle, distance):
+        direction = vehicle.direction
+        lane = self.lanes[direction]
+        if not lane:
+            return False
+
+        p = progress(vehicle, direction)
+        i = bisect_right(lane, p, key=lambda v: progress(v, direction))
+
+        # vehicles stacked at a spawn point can swap places within a frame,
+        # so look at the neighbours of the bisect position as well
+        nearest = None
+        for other in lane[max(0, i - 1):i + 2]:
+            q = progress(other, direction)
+            if q > p and (nearest is None or q < nearest):
+                nearest = q
+        return nearest is not None and nearest - p < distance
+
+
+class WaitTracker:
+    def __init__(self):
+        self.time = 0.0
+        self.count = 0
+        # per lane: waiting vehicle -> time it started waiting, oldest first
+        self.lanes = {d: {} for d in DIRECTIONS}
+        self._lane_of = {}
+
+    def clear(self):
+        self.time = 0.0
+        self.count = 0
+        for lane in self.lanes.values():
+            lane.clear()
+        self._lane_of.clear()
+
+    def tick(self, dt):
+        self.time += dt
+
+    def set_waiting(self, vehicle, waiting):
+        direction = self._lane_of.get(vehicle)
+        if waiting:
+            if direction is None:
+                direction = vehicle.direction
+                self.lanes[direction][vehicle] = self.time
+                self._lane_of[vehicle] = direction
+                self.count += 1
+        elif direction is not None:
+            del self.lanes[direction][vehicle]
+            del self._lane_of[vehicle]
+            self.count -= 1
+
+    def remove(self, vehicle):
+        self.set_waiting(vehicle, False)
+
+    def move(self, vehicle):
+        direction = self._lane_of.get(vehicle)
+        if direction is not None and direction != vehicle.direction:
+            since = self.lanes[direction].pop(vehicle)
+            self.lanes[vehicle.direction][vehicle] = since
+            self._lane_of[vehicle] = vehicle.direction
+
+    def queue_length(self, direction):
+        return len(self.lanes[direction])
+
+    def wait_time(self, vehicle):
+        direction = self._lane_of.get(vehicle)
+        if direction is None:
+            return 0.0
+        return self.time - self.lanes[direction][vehicle]
+
+    def longest_wait(self):
+        starts = [next(iter(lane.values())) for lane in self.lanes.values() if lane]
+        return self.time - min(starts) if starts else 0.0
+
+    def lane_jammed(self, length, seconds):
+        # a lane is jammed once more than `length` vehicles have all been
+        # waiting in it for at least `seconds`
+        for lane in self.lanes.values():
+            if len(lane) > length:
+                since = next(islice(lane.values(), length, None))
+                if self.time - since >= seconds:
+                    return True
+        return False
+
+    def time_to_jam(self, length, seconds):
+        # seconds until lane_jammed turns True if nobody starts or stops waiting
+        remaining = float("inf")
+        for lane in self.lanes.values():
+            if len(lane) > length:
+                since = next(islice(lane.values(), length, None))
+                remaining = min(remaining, seconds - (self.time - since))
+        return remaining
+
+
+class LaneQueues:
+    MIN_GAP = 45
+
+    def __init__(self):
+        self.lanes = {d: deque() for d in DIRECTIONS}
+        self.emergency = EmergencyIndex()
+        self.waits = WaitTracker()
+
+    def clear(self):
+        for lane in self.lanes.values():
+            for v in lane:
+                v._waits = None
+            lane.clear()
+        self.emergency.clear()
+        self.waits.clear()
+
+    def add(self, vehicle):
+        self.lanes[vehicle.direction].append(vehicle)
+        if vehicle.priority:
+            self.emergency.add(vehicle)
+        vehicle._waits = self.waits
+        self.waits.set_waiting(vehicle, vehicle.is_waiting())
+
+    def remove(self, vehicle, direction=None):
+        self.lanes[direction or vehicle.direction].remove(vehicle)
+        if vehicle.priority:
+            self.emergency.remove(vehicle, direction)
+        vehicle._waits = None
+        self.waits.remove(vehicle)
+
+    def move(self, vehicle, old_direction):
+        self.lanes[old_direction].remove(vehicle)
+        self.insert(vehicle)
+        if vehicle.priority:
+            self.emergency.remove(vehicle, old_direction)
+            self.emergency.add(vehicle)
+        self.waits.move(vehicle)
+
+    def insert(self, vehicle):
+        direction = vehicle.direction
+        lane = self.lanes[direction]
+        p = progress(vehicle, direction)
+
+        i = 0
+        for other in lane:
+            if progress(other, direction) < p:
+                break
+            i += 1
+        lane.insert(i, vehicle)
+
+    def _resort(self, direction):
+        lane = self.lanes[direction]
+        ordered = sorted(lane, key=lambda v: progress(v, direction), reverse=True)
+        lane.clear()
+        lane.extend(ordered)
+
+    def demand(self, direction, zone_start=None):
+        # (queued, approaching): vehicles short of the stop line, and those of
+        # them standing still; with zone_start, only those whose progress has
+        # reached the detector (so off-screen spawns don't count). Vehicles
+        # blocked past the stop line are the box's problem, not the arm's
+        queued = approaching = 0
+        for v in self.lanes[direction]:
+            if not v.passed_stop and (zone_start is None or
+                                      progress(v, direction) >= zone_start):
+                approaching += 1
+                if v.is_waiting():
+                    queued += 1
+        return queued, approaching
+
+    def occupied(self, exit_at):
+        # any vehicle past its stop line whose rear has not left the box
+        for direction, lane in self.lanes.items():
+            for v in lane:
+                if v.passed_stop and progress(v, direction) - v.SIZE[1] / 2 < exit_at[v.dir]:
+                    return True
+        return False
+
+    def _set_blocked(self, vehicle, blocked):
+        vehicle.blocked = blocked
+        self.waits.set_waiting(vehicle, blocked or vehicle._should_stop_cached)
+
+    def _follow(self, direction, lane):
+        vertical = direction in ("N", "S")
+        sign = LANE_SIGN[direction]
+        min_gap = self.MIN_GAP
+
+        front = lane[0]
+        if front.blocked:
+            self._set_blocked(front, False)
+        for back in islice(lane, 1, None):
+            if vertical:
+                delta = front.y - back.y
+            else:
+                delta = front.x - back.x
+            if sign * delta < 0:
+                return False
+            blocked = abs(delta) < min_gap
+            if blocked != back.blocked:
+                self._set_blocked(back, blocked)
+            front = back
+        return True
+
+    def update_following(self):
+        for direction, lane in self.lanes.items():
+            if not lane:
+                continue
+            if not self._follow(direction, lane):
+                self._resort(direction)
+                self._follow(direction, lane)
@@ -1,66 +1,144 @@
+import argparse
 import random
-import pygame
 import sys
+import time
 
 from road import Road
-from traffic_light import TrafficLight
-from controller import IntersectionController
+from controller import IntersectionController, STRATEGIES
 from commands import NextPhaseCommand
 from vehicles import VehicleFactory
-from ui_button import Button
-from screens import MenuScreen, OverScreen
-
-
-class Game:
+from collision import CollisionGrid
+from lanes import LaneQueues
+from intersection import Intersection
+from text_cache import render_text
+from replay import Replay, ReplayRecorder
+from scheduler import EventScheduler
+from telemetry import TelemetrySink
+from demand import CURVES, PoissonDemand
+from profiler import FrameProfiler
+from screens import MenuScreen, PlayScreen, OverScreen
+
+# pygame is only loaded by the windowed game: the rendering layer (render,
+# dirty_rects, ui_button) is imported on demand, so headless runs, tools and
+# tests never pay for it
+
+
+class Game(Intersection):
     WIDTH = 900
     HEIGHT = 700
     FPS = 60
+    SIM_HZ = 120
+    MAX_CATCH_UP_STEPS = 8
     BG_COLOR = (30, 30, 30)
+    HUD_COLOR = (240, 240, 240)
 
     WIN_TIME = 10.0
     JAM_THRESHOLD = 6
-
-    def __init__(self, template="cross"):
-        pygame.init()
-
-        self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
-        pygame.display.set_caption("Šviesoforų meistras")
-        self.clock = pygame.time.Clock()
+    # (length, seconds): also end the round once a single lane has held more
+    # than `length` waiting vehicles for `seconds`; None disables the rule
+    LANE_JAM = None
+
+    OUTCOME_MESSAGES = {
+        "crash": "CRASH!",
+        "jam": "JAM! GAME OVER",
+        "win": "YOU WIN!",
+    }
+
+    def __init__(self, template="cross", headless=False, engine="object", dirty_rects=False,
+                 seed=None, record_path=None, phase_timings=None,
+                 profile=False, profile_path=None, controller="fixed", telemetry_path=None,
+                 demand=None):
+        self.headless = headless
+        self.profiler = FrameProfiler() if profile or profile_path else None
+        self.profile_path = profile_path
+        self.show_profile = False
+        self.interpolate = not headless
+        self.sim_dt = 1 / self.SIM_HZ
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self.phase_timings = phase_timings
+        self.controller_strategy = controller
+        self.seeds = random.Random(seed)
+        self.rng = random.Random()
+        self.round_seed = None
+        self.record_path = record_path
+        self.recorder = ReplayRecorder() if record_path is not None else None
+        self.telemetry = TelemetrySink(telemetry_path) if telemetry_path is not None else None
+        self.renderer = None
         self.running = True
 
-        self.font = pygame.font.SysFont("arial", 26)
-        self.big_font = pygame.font.SysFont("arial", 64, bold=True)
-
-        btn_w, btn_h = 220, 55
-        cx, cy = self.WIDTH // 2, self.HEIGHT // 2
-        self.restart_button = Button(
-            rect=(cx - btn_w // 2, cy + 40, btn_w, btn_h),
-            text="Restart",
-            font=self.font
-        )
-        self.quit_button = Button(
-            rect=(cx - btn_w // 2, cy + 110, btn_w, btn_h),
-            text="Quit",
-            font=self.font
-        )
-
-        self.vehicles = []
+        if headless:
+            self.screen = None
+            self.clock = None
+            self.font = None
+            self.big_font = None
+            self.small_font = None
+            self.restart_button = None
+            self.quit_button = None
+        else:
+            import pygame
+            import render
+            from ui_button import Button
+
+            self.screen = render.init_display((self.WIDTH, self.HEIGHT), "Šviesoforų meistras")
+            self.clock = pygame.time.Clock()
+
+            self.font = render.get_font("arial", 26)
+            self.big_font = render.get_font("arial", 64, bold=True)
+            self.small_font = render.get_font("monospace", 14)
+
+            if dirty_rects:
+                from dirty_rects import DirtyRectRenderer
+                self.renderer = DirtyRectRenderer()
+
+            btn_w, btn_h = 220, 55
+            cx, cy = self.WIDTH // 2, self.HEIGHT // 2
+            self.restart_button = Button(
+                rect=(cx - btn_w // 2, cy + 40, btn_w, btn_h),
+                text="Restart",
+                font=self.font
+            )
+            self.quit_button = Button(
+                rect=(cx - btn_w // 2, cy + 110, btn_w, btn_h),
+                text="Quit",
+                font=self.font
+            )
+
+        self.store = None
+        if engine == "numpy":
+            from vehicle_store import VehicleStore
+            self.store = VehicleStore()
+        self.vehicles = self.store.views if self.store is not None else []
+        self.factory = VehicleFactory()
+        self.lanes = LaneQueues()
+        # simulated seconds since the round started; the clock demand models
+        # schedule arrivals against
+        self.sim_time = 0.0
         self.spawn_timer = 0.0
         self.spawn_interval = 1.0
         self.spawn_prob = 0.7
+        # a DemandModel replaces the interval/coin-flip spawner; its arrivals
+        # wait per arm until the spawn point is clear
+        self.demand = demand
+        self.init_backlog()
 
         self.time_survived = 0.0
         self.game_over = False
         self.win = False
+        self.outcome = None
 
         self.build_intersection(template)
 
-        self.screen_state = MenuScreen()
+        self.screen_state = PlayScreen() if headless else MenuScreen()
 
     def set_screen(self, screen_state):
         self.screen_state = screen_state
+        if self.renderer is not None:
+            self.renderer.invalidate()
 
     def handle_events(self):
+        import pygame
+
         events = pygame.event.get()
         for e in events:
             if e.type == pygame.QUIT:
@@ -71,155 +149,336 @@ class Game:
         self.screen_state.update(self, dt)
 
     def draw(self):
-        self.screen_state.draw(self, self.screen)
-        pygame.display.flip()
+        import pygame
+
+        rects = self.screen_state.draw(self, self.screen)
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+    def issue(self, command):
+        if self.recorder is not None:
+            self.recorder.command(command.CODE)
+        command.execute()
 
     def update_playing(self, dt):
         if self.game_over:
             return
 
-        self.controller.update(dt)
-
-        self.spawn_timer += dt
-        if self.spawn_timer >= self.spawn_interval:
-            self.spawn_timer = 0.0
-            if random.random() < self.spawn_prob:
-                direction = random.choice(self.road.allowed_directions())
-                self.vehicles.append(VehicleFactory.create(direction, self))
-
-        for v in self.vehicles:
-            v.update(dt, self)
-
-        self.vehicles = [v for v in self.vehicles if v.alive]
-
-        lane_groups = {}
-        for v in self.vehicles:
-            lane_groups.setdefault(v.direction, []).append(v)
-
-        MIN_GAP = 45
-
-        for direction, group in lane_groups.items():
-            if direction == "N":
-                group.sort(key=lambda c: c.y, reverse=True)
-            elif direction == "S":
-                group.sort(key=lambda c: c.y)
-            elif direction == "W":
-                group.sort(key=lambda c: c.x, reverse=True)
-            elif direction == "E":
-                group.sort(key=lambda c: c.x)
-
-            group[0].blocked = False
-
-            for i in range(1, len(group)):
-                front = group[i - 1]
-                back = group[i]
-                gap = abs(front.y - back.y) if direction in ("N", "S") else abs(front.x - back.x)
-                back.blocked = gap < MIN_GAP
-
-        inter = self.road.intersection_rect()
-        in_intersection = [v for v in self.vehicles if v.rect().colliderect(inter)]
-
-        for i in range(len(in_intersection)):
-            for j in range(i + 1, len(in_intersection)):
-                a = in_intersection[i]
-                b = in_intersection[j]
-                if a.rect().colliderect(b.rect()):
-                    print("CRASH!")
-                    self.game_over = True
-                    self.win = False
-                    self.set_screen(OverScreen())
-                    return
-
-        waiting = sum(1 for v in self.vehicles if v.is_waiting())
-        if waiting >= self.JAM_THRESHOLD:
-            print("JAM! GAME OVER")
-            self.game_over = True
-            self.win = False
-            self.set_screen(OverScreen())
+        if self.recorder is not None:
+            self.recorder.frame(dt)
+
+        prof = self.profiler
+        if prof is not None:
+            prof.begin()
+
+        self.step_traffic(dt)
+
+        crash = self.first_collision()
+        if prof is not None:
+            prof.lap("collisions")
+
+        if self.telemetry is not None:
+            self.telemetry.tick(self)
+            if prof is not None:
+                prof.lap("telemetry")
+
+        if crash is not None:
+            self.end_round("crash")
+            return
+
+        waits = self.lanes.waits
+        if self.store is not None:
+            for v, waiting in self.store.waiting_changes():
+                waits.set_waiting(v, waiting)
+        # arrivals queued behind a waiting vehicle at the spawn point count
+        # as waiting too
+        waiting = waits.count
+        if self.backlog:
+            waiting += self.held_backlog()
+        jammed = waiting >= self.JAM_THRESHOLD or (
+            self.LANE_JAM is not None and waits.lane_jammed(*self.LANE_JAM))
+        if prof is not None:
+            prof.lap("jam")
+        if jammed:
+            self.end_round("jam")
             return
 
         self.time_survived += dt
         if self.time_survived >= self.WIN_TIME:
-            print("YOU WIN!")
-            self.game_over = True
-            self.win = True
-            self.set_screen(OverScreen())
+            self.end_round("win")
             return
 
+    @property
+    def entries(self):
+        return self.road.allowed_directions()
+
+    def retire(self, vehicles):
+        # store views are not pooled: add_vehicle recycles the plain vehicle
+        # a view was copied from instead
+        if self.store is None:
+            for v in vehicles:
+                self.factory.release(v)
+
+    def end_round(self, outcome):
+        if not self.headless:
+            print(self.OUTCOME_MESSAGES[outcome])
+        self.outcome = outcome
+        self.game_over = True
+        self.win = outcome == "win"
+        self.set_screen(OverScreen())
+
+        if self.telemetry is not None:
+            self.telemetry.outcome(self)
+        if self.record_path is not None:
+            self.recorder.save(self.record_path)
+
     def draw_playing(self, screen):
-        screen.fill(self.BG_COLOR)
-        self.road.draw(screen)
+        from render import draw_light, draw_road, draw_vehicles
+
+        prof = self.profiler
+        if prof is not None:
+            prof.begin()
+
+        draw_road(screen, self.road)
+        if prof is not None:
+            prof.lap("draw_road")
 
         for light in self.lights:
-            light.draw(screen)
+            draw_light(screen, light)
+        if prof is not None:
+            prof.lap("draw_lights")
+
+        draw_vehicles(screen, self.vehicles, self.alpha)
+        if prof is not None:
+            prof.lap("draw_vehicles")
 
-        for v in self.vehicles:
-            v.draw(screen)
+        for text, pos in self.hud_lines():
+            screen.blit(render_text(self.font, text, True, self.HUD_COLOR), pos)
+        if prof is not None:
+            prof.lap("draw_hud")
 
-        timer_text = self.font.render(
-            f"Time: {self.time_survived:.1f}/{self.WIN_TIME:.0f}s",
-            True, (240, 240, 240)
-        )
-        screen.blit(timer_text, (10, 10))
+        if prof is not None and self.show_profile:
+            prof.draw_overlay(screen, self.small_font)
 
-        waiting = sum(1 for v in self.vehicles if v.is_waiting())
-        jam_text = self.font.render(
-            f"Waiting cars: {waiting}/{self.JAM_THRESHOLD}",
-            True, (240, 240, 240)
-        )
-        screen.blit(jam_text, (10, 40))
+    def toggle_profile_overlay(self):
+        if self.profiler is None:
+            return
+        self.show_profile = not self.show_profile
+        if self.renderer is not None:
+            self.renderer.invalidate()
+
+    def hud_lines(self):
+        waiting = self.lanes.waits.count
+        return [
+            (f"Time: {self.time_survived:.1f}/{self.WIN_TIME:.0f}s", (10, 10)),
+            (f"Waiting cars: {waiting}/{self.JAM_THRESHOLD}", (10, 40)),
+        ]
 
     def build_intersection(self, template):
-        self.road = Road(self.WIDTH, self.HEIGHT, template=template)
-
-        cx = self.road.center_x
-        cy = self.road.center_y
-        off = self.road.stop_offset
-        rw_half = self.road.road_width // 2
-        side_offset = rw_half + 35
-
-        a = self.road.arms()
-        self.lights = []
-
-        if a["N"]:
-            self.lights.append(TrafficLight(cx - side_offset, cy - off - 30, direction="vertical"))
-        if a["S"]:
-            self.lights.append(TrafficLight(cx + side_offset, cy + off + 30, direction="vertical"))
-        if a["W"]:
-            self.lights.append(TrafficLight(cx - off - 30, cy + side_offset, direction="horizontal"))
-        if a["E"]:
-            self.lights.append(TrafficLight(cx + off + 30, cy - side_offset, direction="horizontal"))
-
-        vertical = [l for l in self.lights if l.direction == "vertical"]
-        horizontal = [l for l in self.lights if l.direction == "horizontal"]
-
-        self.controller = IntersectionController(vertical, horizontal)
+        self.road = Road(self.WIDTH, self.HEIGHT, template=template, bg_color=self.BG_COLOR)
+        self.collisions = CollisionGrid(self.road.intersection_rect())
+
+        self.controller = IntersectionController.for_road(
+            self.road, STRATEGIES[self.controller_strategy]())
+        self.controller.sensors = self.lanes
+        self.lights = self.controller.lights
+        if self.phase_timings is not None:
+            self.controller.set_timings(*self.phase_timings)
         self.next_phase_cmd = NextPhaseCommand(self.controller)
+        self.commands = {NextPhaseCommand.CODE: self.next_phase_cmd}
+        if self.telemetry is not None:
+            self.telemetry.attach(self)
 
         self.reset()
 
-    def reset(self):
-        self.vehicles.clear()
+    def reset(self, seed=None):
+        self.round_seed = seed if seed is not None else self.seeds.getrandbits(64)
+        self.rng.seed(self.round_seed)
+
+        if self.store is not None:
+            self.store.clear()
+        else:
+            for v in self.vehicles:
+                self.factory.release(v)
+            self.vehicles.clear()
+        self.lanes.clear()
+        self.sim_time = 0.0
         self.spawn_timer = 0.0
+        self.clear_backlog()
+        if self.demand is not None:
+            self.demand.reset(self)
         self.time_survived = 0.0
         self.game_over = False
         self.win = False
+        self.outcome = None
 
+        if self.telemetry is not None:
+            self.telemetry.begin_round(self)
         self.controller.phase_index = 0
         self.controller.timer = 0.0
         self.controller._apply_phase()
 
+        if self.recorder is not None:
+            self.recorder.begin(self.round_seed, self.road.template, self.replay_settings())
+
+    def replay_settings(self):
+        timings = self.phase_timings
+        return {
+            "controller": self.controller_strategy,
+            "phase_timings": list(timings) if timings is not None else None,
+            "demand": self.demand.config() if self.demand is not None else None,
+        }
+
+    def advance(self, frame_dt):
+        self.accumulator += frame_dt
+
+        steps = 0
+        while self.accumulator >= self.sim_dt:
+            if steps == self.MAX_CATCH_UP_STEPS:
+                self.accumulator %= self.sim_dt
+                break
+            self.update(self.sim_dt)
+            self.accumulator -= self.sim_dt
+            steps += 1
+
+        # once a round is over nothing snapshots prev_x/prev_y any more, so
+        # draw the final positions instead of blending toward stale ones
+        if self.interpolate and not self.game_over:
+            self.alpha = self.accumulator / self.sim_dt
+        else:
+            self.alpha = 1.0
+        return steps
+
     def run(self):
         while self.running:
-            dt = self.clock.tick(self.FPS) / 1000
+            frame_dt = self.clock.tick(self.FPS) / 1000
             self.handle_events()
-            self.update(dt)
+            self.advance(frame_dt)
             self.draw()
 
+        if self.record_path is not None:
+            self.recorder.save(self.record_path)
+        if self.profile_path is not None:
+            self.profiler.dump(self.profile_path)
+        if self.telemetry is not None:
+            self.telemetry.close()
+
+        import pygame
+
         pygame.quit()
         sys.exit()
 
+    def run_headless(self, rounds=1, dt=None, event_driven=False):
+        dt = dt if dt is not None else self.sim_dt
+        outcomes = {}
+        steps = 0
+        scheduler = EventScheduler(self) if event_driven else None
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            self.reset()
+            if scheduler is not None:
+                while not self.game_over:
+                    steps += scheduler.step(dt)
+            else:
+                while not self.game_over:
+                    self.update_playing(dt)
+                    steps += 1
+            outcomes[self.outcome] = outcomes.get(self.outcome, 0) + 1
+        wall_time = time.perf_counter() - start
+
+        sim_time = steps * dt
+        return {
+            "rounds": rounds,
+            "steps": steps,
+            "sim_time": sim_time,
+            "wall_time": wall_time,
+            "speedup": sim_time / wall_time if wall_time > 0 else float("inf"),
+            "outcomes": outcomes,
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Šviesoforų meistras")
+    parser.add_argument("--headless", action="store_true",
+                        help="simulate without a window, as fast as possible")
+    parser.add_argument("--template", default="cross", choices=("cross", "t"))
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--dt", type=float, default=1 / Game.SIM_HZ)
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for spawning, vehicle types and turns")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="write the last round's dt and input log to PATH")
+    parser.add_argument("--replay", metavar="PATH", default=None,
+                        help="replay a recorded round headless and print its outcome")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="time each update/draw stage and write percentiles to PATH on exit "
+                             "(F3 toggles the on-screen overlay)")
+    parser.add_argument("--telemetry", metavar="PATH", default=None,
+                        help="stream per-tick vehicle state and phase changes to PATH "
+                             "(read back with telemetry.py)")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="redraw and update only the changed parts of the play screen")
+    parser.add_argument("--event-driven", action="store_true",
+                        help="headless only: jump over frames where nothing but motion happens "
+                             "(object engine; same results as fixed stepping)")
+    parser.add_argument("--engine", default="object", choices=("object", "numpy"),
+                        help="per-object vehicles or the batched numpy store (only faster "
+                             "from roughly 500 live vehicles up; see benchmark.py engines)")
+    parser.add_argument("--controller", default="fixed", choices=sorted(STRATEGIES),
+                        help="signal strategy: fixed timers or sensor-driven max-pressure")
+    parser.add_argument("--demand", type=float, metavar="RATE", default=None,
+                        help="Poisson arrivals at RATE vehicles/s per arm instead of the "
+                             "one-per-interval coin flip")
+    parser.add_argument("--demand-curve", default="flat", choices=sorted(CURVES),
+                        help="time-varying demand multiplier over each round")
+    parser.add_argument("--platoon-prob", type=float, default=0.0,
+                        help="chance that an arrival is a platoon of 2-4 vehicles")
+    parser.add_argument("--ambulance-ratio", type=float, default=0.08)
+    parser.add_argument("--police-ratio", type=float, default=0.06)
+    return parser.parse_args(argv)
+
+
+def build_demand(args):
+    if args.demand is None:
+        return None
+    curve = CURVES[args.demand_curve]
+    return PoissonDemand(args.demand, curve(Game.WIN_TIME) if curve else None,
+                         platoon_prob=args.platoon_prob,
+                         ambulance=args.ambulance_ratio, police=args.police_ratio)
+
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    args = parse_args()
+    if args.replay:
+        replay = Replay.load(args.replay)
+        # the replay carries its own controller, timings and demand settings
+        game = Game(replay.template, headless=True, engine=args.engine)
+        start = time.perf_counter()
+        outcome = replay.play(game)
+        wall_time = time.perf_counter() - start
+        print(f"outcome: {outcome}  time: {game.time_survived:.2f}s  "
+              f"frames: {len(replay.frames)}  wall: {wall_time:.3f}s")
+    elif args.headless:
+        game = Game(args.template, headless=True, engine=args.engine, seed=args.seed,
+                    profile_path=args.profile, controller=args.controller,
+                    telemetry_path=args.telemetry, demand=build_demand(args))
+        stats = game.run_headless(args.rounds, args.dt, event_driven=args.event_driven)
+        if args.profile is not None:
+            game.profiler.dump(args.profile)
+        if game.telemetry is not None:
+            game.telemetry.close()
+            if game.telemetry.dropped:
+                print(f"telemetry: dropped {game.telemetry.dropped} ticks, "
+                      f"{game.telemetry.dropped_events} events")
+        print(f"rounds: {stats['rounds']}  steps: {stats['steps']}")
+        print(f"simulated: {stats['sim_time']:.1f}s  wall: {stats['wall_time']:.2f}s  "
+              f"speed: {stats['speedup']:.0f} sim-s/wall-s")
+        print("outcomes: " + ", ".join(f"{k}={v}" for k, v in sorted(stats["outcomes"].items())))
+    else:
+        game = Game(dirty_rects=args.dirty_rects, seed=args.seed, record_path=args.record,
+                    profile_path=args.profile, controller=args.controller,
+                    telemetry_path=args.telemetry, demand=build_demand(args))
+        game.run()
\ No newline at end of file
@@ -0,0 +1,319 @@
+import argparse
+import multiprocessing
+import os
+import time
+from itertools import islice
+from multiprocessing import shared_memory
+
+from controller import STRATEGIES
+from vehicles import DIRECTIONS, Car, Ambulance, PoliceCar, VehicleFactory
+from world import NEIGHBOUR_STEP, Cell, cell_layout
+
+
+KINDS = (Car, Ambulance, PoliceCar)
+KIND_CODE = {kind: i for i, kind in enumerate(KINDS)}
+
+# a handoff record is (target cell, vehicle kind, heading) as int32s
+RECORD = 3
+CAPACITY = 16384
+
+
+class Mailbox:
+    def __init__(self, name=None, capacity=CAPACITY):
+        size = capacity * RECORD * 4
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.capacity = capacity
+        self.ints = self.shm.buf.cast("i")
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, records):
+        if len(records) > self.capacity:
+            return False
+        ints = self.ints
+        for n, (cell, kind, direction) in enumerate(records):
+            i = n * RECORD
+            ints[i] = cell
+            ints[i + 1] = kind
+            ints[i + 2] = direction
+        return True
+
+    def read(self, count):
+        ints = self.ints
+        return [(ints[i], ints[i + 1], ints[i + 2]) for i in range(0, count * RECORD, RECORD)]
+
+    def close(self, unlink=False):
+        self.ints.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class Shard:
+    # cells lo..hi-1 (row-major) of the grid World(**config) would build,
+    # seeded the same way; the rest of the grid lives in other workers
+    def __init__(self, config, lo, hi):
+        config = dict(config)
+        self.rows = rows = config.pop("rows")
+        self.cols = cols = config.pop("cols")
+        template = config.pop("template")
+        layout = islice(cell_layout(rows, cols, config.pop("seed")), lo, hi)
+
+        self.lo = lo
+        self.factory = VehicleFactory()
+        self.cells = [Cell(row, col, template, seed, entries, factory=self.factory, **config)
+                      for row, col, seed, entries in layout]
+        # every cell has the same template, so any of them tells which arms
+        # a neighbour has
+        self.arms = self.cells[0].road.geometry.arms
+        self.exited = 0
+
+    def receive(self, records):
+        cells = self.cells
+        for index, kind, direction in records:
+            v = self.factory.build(KINDS[kind], 0, 0, DIRECTIONS[direction])
+            cells[index - self.lo].enter(v)
+
+    def step(self, dt):
+        rows, cols = self.rows, self.cols
+        arms = self.arms
+        out = []
+        for cell in self.cells:
+            for v in cell.step(dt):
+                dr, dc = NEIGHBOUR_STEP[v.direction]
+                row, col = cell.row + dr, cell.col + dc
+                if 0 <= row < rows and 0 <= col < cols and arms[v.direction]:
+                    out.append((row * cols + col, KIND_CODE[type(v)], v.dir))
+                else:
+                    self.exited += 1
+                self.factory.release(v)
+        return out
+
+    def stats(self):
+        cells = self.cells
+        return {
+            "vehicles": sum(len(cell.vehicles) for cell in cells),
+            "queued": sum(cell.backlog for cell in cells),
+            "spawned": sum(cell.spawned for cell in cells),
+            "exited": self.exited,
+            "crashes": sum(cell.crashes for cell in cells),
+            "waiting": sum(cell.lanes.waits.count for cell in cells),
+        }
+
+    def snapshot(self):
+        return [[(type(v).__name__, v.x, v.y, v.direction) for v in cell.vehicles]
+                for cell in self.cells]
+
+
+def _serve(conn, config, lo, hi, inbox_name, outbox_name):
+    shard = Shard(config, lo, hi)
+    inbox = Mailbox(inbox_name)
+    outbox = Mailbox(outbox_name)
+    try:
+        while True:
+            msg = conn.recv()
+            op = msg[0]
+            if op in ("step", "deliver"):
+                _, dt, inbound = msg
+                shard.receive(inbox.read(inbound) if isinstance(inbound, int) else inbound)
+                if op == "deliver":
+                    conn.send(None)
+                    continue
+                out = shard.step(dt)
+                live = sum(len(cell.vehicles) for cell in shard.cells)
+                conn.send((len(out) if outbox.write(out) else out, live))
+            elif op == "stats":
+                conn.send(shard.stats())
+            elif op == "snapshot":
+                conn.send(shard.snapshot())
+            else:
+                break
+    finally:
+        inbox.close()
+        outbox.close()
+        conn.close()
+
+
+class ParallelWorld:
+    def __init__(self, rows, cols, template="cross", seed=None, spawn_interval=1.0,
+                 spawn_prob=0.7, phase_timings=None, controller="fixed", workers=None):
+        config = {
+            "rows": rows, "cols": cols, "template": template, "seed": seed,
+            "spawn_interval": spawn_interval, "spawn_prob": spawn_prob,
+            "phase_timings": phase_timings, "controller": controller,
+        }
+        self.rows = rows
+        self.cols = cols
+        cells = rows * cols
+        workers = max(1, min(workers or os.cpu_count() or 1, cells))
+        self.workers = workers
+
+        # contiguous shards keep every worker's outbox in global cell order
+        bounds = [cells * i // workers for i in range(workers + 1)]
+        self.owner = [0] * cells
+        for w in range(workers):
+            for index in range(bounds[w], bounds[w + 1]):
+                self.owner[index] = w
+
+        self.time = 0.0
+        self.handoffs = 0
+        self._pending = [[] for _ in range(workers)]
+        self._live = 0
+
+        ctx = multiprocessing.get_context()
+        self.inboxes = [Mailbox() for _ in range(workers)]
+        self.outboxes = [Mailbox() for _ in range(workers)]
+        self.conns = []
+        self.procs = []
+        for w in range(workers):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_serve, daemon=True, args=(
+                child, config, bounds[w], bounds[w + 1],
+                self.inboxes[w].name, self.outboxes[w].name))
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+
+    def _send_pending(self, op, dt):
+        for w, conn in enumerate(self.conns):
+            pending = self._pending[w]
+            inbound = len(pending) if self.inboxes[w].write(pending) else pending
+            conn.send((op, dt, inbound))
+
+    def step(self, dt):
+        self._send_pending("step", dt)
+
+        # sync phase: route every handoff to the worker that owns its target,
+        # in global source order so targets see the same order as World.step
+        pending = [[] for _ in self.conns]
+        live = 0
+        for w, conn in enumerate(self.conns):
+            out, count = conn.recv()
+            live += count
+            records = self.outboxes[w].read(out) if isinstance(out, int) else out
+            for record in records:
+                pending[self.owner[record[0]]].append(record)
+            self.handoffs += len(records)
+
+        self._pending = pending
+        self._live = live + sum(len(p) for p in pending)
+        self.time += dt
+
+    def _flush(self):
+        if any(self._pending):
+            self._send_pending("deliver", 0.0)
+            for conn in self.conns:
+                conn.recv()
+            self._pending = [[] for _ in self.conns]
+
+    def vehicle_count(self):
+        return self._live
+
+    def stats(self):
+        self._flush()
+        totals = {}
+        for conn in self.conns:
+            conn.send(("stats",))
+        for conn in self.conns:
+            for key, value in conn.recv().items():
+                totals[key] = totals.get(key, 0) + value
+        return {
+            "cells": self.rows * self.cols,
+            "sim_time": self.time,
+            "vehicles": totals["vehicles"],
+            "queued": totals["queued"],
+            "spawned": totals["spawned"],
+            "handoffs": self.handoffs,
+            "exited": totals["exited"],
+            "crashes": totals["crashes"],
+            "waiting": totals["waiting"],
+        }
+
+    def snapshot(self):
+        self._flush()
+        cells = []
+        for conn in self.conns:
+            conn.send(("snapshot",))
+        for conn in self.conns:
+            cells.extend(conn.recv())
+        return cells
+
+    def run(self, seconds, dt=1 / 120):
+        steps = round(seconds / dt)
+        vehicle_steps = 0
+
+        start = time.perf_counter()
+        for _ in range(steps):
+            vehicle_steps += self._live
+            self.step(dt)
+        wall = time.perf_counter() - start
+
+        stats = self.stats()
+        stats.update({
+            "steps": steps,
+            "wall_time": wall,
+            "steps_per_sec": steps / wall if wall else float("inf"),
+            "vehicle_steps_per_sec": vehicle_steps / wall if wall else float("inf"),
+            "speedup": seconds / wall if wall else float("inf"),
+        })
+        return stats
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self.procs:
+            proc.join(timeout=5)
+        for conn in self.conns:
+            conn.close()
+        for box in self.inboxes + self.outboxes:
+            box.close(unlink=True)
+        self.conns = []
+        self.procs = []
+        self.inboxes = []
+        self.outboxes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Grid simulation stepped across worker processes")
+    parser.add_argument("--rows", type=int, default=10)
+    parser.add_argument("--cols", type=int, default=10)
+    parser.add_argument("--template", choices=("cross", "t"), default="cross")
+    parser.add_argument("--seconds", type=float, default=10.0, help="simulated seconds")
+    parser.add_argument("--dt", type=float, default=1 / 120, help="fixed simulation step")
+    parser.add_argument("--spawn-interval", type=float, default=1.0)
+    parser.add_argument("--spawn-prob", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--controller", default="fixed", choices=sorted(STRATEGIES))
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with ParallelWorld(args.rows, args.cols, args.template, seed=args.seed,
+                       spawn_interval=args.spawn_interval, spawn_prob=args.spawn_prob,
+                       controller=args.controller, workers=args.workers) as world:
+        stats = world.run(args.seconds, args.dt)
+    print(f"{stats['cells']} intersections on {world.workers} workers, "
+          f"{stats['sim_time']:.1f}s simulated in {stats['wall_time']:.2f}s")
+    print(f"vehicles live {stats['vehicles']}, queued {stats['queued']}, "
+          f"spawned {stats['spawned']}, handoffs {stats['handoffs']}, "
+          f"exited {stats['exited']}, crashes {stats['crashes']}")
+    print(f"{stats['steps_per_sec']:.0f} steps/s, "
+          f"{stats['vehicle_steps_per_sec']:.0f} vehicle updates/s")
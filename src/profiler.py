@@ -0,0 +1,63 @@
+import json
+from collections import deque
+from math import ceil
+from time import perf_counter_ns
+
+from text_cache import render_text
+
+
+class FrameProfiler:
+    WINDOW = 600
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.samples = {}
+        self._last = 0
+
+    def begin(self):
+        self._last = perf_counter_ns()
+
+    def lap(self, stage):
+        now = perf_counter_ns()
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples[stage] = deque(maxlen=self.window)
+        samples.append(now - self._last)
+        self._last = now
+
+    def stats(self, stage):
+        ordered = sorted(self.samples[stage])
+        n = len(ordered)
+        result = {"count": n, "mean_ms": sum(ordered) / n / 1e6, "max_ms": ordered[-1] / 1e6}
+        for p in self.PERCENTILES:
+            # nearest rank: the smallest sample with at least p% at or below it
+            result[f"p{p}_ms"] = ordered[max(0, ceil(n * p / 100) - 1)] / 1e6
+        return result
+
+    def report(self):
+        return {stage: self.stats(stage) for stage in self.samples if self.samples[stage]}
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def draw_overlay(self, screen, font, pos=(560, 10)):
+        import pygame
+
+        lines = [f"{'stage':<14}{'p50':>7}{'p95':>7}{'p99':>7}"]
+        for stage, s in self.report().items():
+            lines.append(f"{stage:<14}{s['p50_ms']:>7.3f}{s['p95_ms']:>7.3f}{s['p99_ms']:>7.3f}")
+
+        labels = [render_text(font, line, True, (230, 230, 230)) for line in lines]
+        width = max(label.get_width() for label in labels) + 16
+        height = sum(label.get_height() for label in labels) + 12
+
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 180))
+        screen.blit(panel, pos)
+
+        x, y = pos[0] + 8, pos[1] + 6
+        for label in labels:
+            screen.blit(label, (x, y))
+            y += label.get_height()
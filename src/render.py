@@ -0,0 +1,273 @@
+import pygame
+
+from vehicles import Vehicle
+
+
+LAMP_RADIUS = 9
+LAMP_RIM = (10, 10, 10)
+
+_fonts = {}
+_road_layers = {}
+_atlas = None
+
+
+def init_display(size, caption):
+    # only the subsystems the game uses; pygame.init() would also start audio
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(size)
+    pygame.display.set_caption(caption)
+    return screen
+
+
+def get_font(name, size, bold=False):
+    key = (name, size, bold)
+    font = _fonts.get(key)
+    if font is None:
+        font = _fonts[key] = pygame.font.SysFont(name, size, bold=bold)
+    return font
+
+
+class VehicleAtlas:
+    # every vehicle look (colour and size) pre-rendered upright and sideways
+    # into one colour-keyed surface; the rounded rect is symmetric, so N/S
+    # share a sprite and so do W/E
+    PAD = 2
+    COLORKEY = (255, 0, 255)
+    BORDER_RADIUS = 4
+
+    def __init__(self, classes, screen=None):
+        looks = list(dict.fromkeys((cls.COLOR, cls.SIZE) for cls in classes))
+
+        width = self.PAD
+        height = 0
+        layout = []
+        for color, (w, h) in looks:
+            upright = (width, self.PAD, w, h)
+            sideways = (width + w + self.PAD, self.PAD, h, w)
+            layout.append((color, upright, sideways))
+            width += w + h + 2 * self.PAD
+            height = max(height, h + 2 * self.PAD)
+
+        if screen is None:
+            self.image = pygame.Surface((width, height))
+        else:
+            self.image = pygame.Surface((width, height), 0, screen)
+        self.image.fill(self.COLORKEY)
+        self.image.set_colorkey(self.COLORKEY, pygame.RLEACCEL)
+
+        # indexed by direction code: N, S, W, E
+        self._looks = {}
+        for look, (color, upright, sideways) in zip(looks, layout):
+            pygame.draw.rect(self.image, color, upright, border_radius=self.BORDER_RADIUS)
+            pygame.draw.rect(self.image, color, sideways, border_radius=self.BORDER_RADIUS)
+            self._looks[look] = (upright, upright, sideways, sideways)
+        self.areas = {}
+
+    def sprites(self, cls):
+        # per-class lookup, filled on first use (the numpy engine draws
+        # view subclasses); None if the look is not in the atlas
+        sprites = self._looks.get((cls.COLOR, cls.SIZE))
+        if sprites is not None:
+            self.areas[cls] = sprites
+        return sprites
+
+
+def _vehicle_classes(base=Vehicle):
+    for cls in base.__subclasses__():
+        yield cls
+        yield from _vehicle_classes(cls)
+
+
+def vehicle_atlas(screen=None, vehicles=()):
+    global _atlas
+    classes = set(map(type, vehicles))
+    if _atlas is None or any(_atlas.sprites(cls) is None for cls in classes):
+        _atlas = VehicleAtlas([*_vehicle_classes(), *classes], screen)
+        for cls in classes:
+            _atlas.sprites(cls)
+    return _atlas
+
+
+def draw_vehicles(screen, vehicles, alpha=1.0):
+    # one blits() call for the whole batch instead of a rounded-rect
+    # rasterisation per vehicle
+    atlas = _atlas or vehicle_atlas(screen)
+    image = atlas.image
+    areas = atlas.areas
+    try:
+        batch = [(image, v.draw_rect(alpha), areas[type(v)][v.dir]) for v in vehicles]
+    except KeyError:
+        atlas = vehicle_atlas(screen, vehicles)
+        image = atlas.image
+        areas = atlas.areas
+        batch = [(image, v.draw_rect(alpha), areas[type(v)][v.dir]) for v in vehicles]
+    screen.blits(batch, doreturn=False)
+
+
+def draw_light(screen, light):
+    body_rect = light.body_rect
+
+    pygame.draw.rect(screen, light.HOUSING_COLOR, body_rect, border_radius=6)
+    pygame.draw.rect(screen, light.OUTLINE_COLOR, body_rect, width=2, border_radius=6)
+
+    for pos, color in zip(light.lamp_positions, light.state.lamps):
+        pygame.draw.circle(screen, color, pos, LAMP_RADIUS)
+        pygame.draw.circle(screen, LAMP_RIM, pos, LAMP_RADIUS, 2)
+
+
+def draw_road(screen, road, area=None):
+    layer = road_layer(road, screen)
+    if area is None:
+        screen.blit(layer, (0, 0))
+    else:
+        screen.blit(layer, area, area)
+
+
+def road_layer(road, screen):
+    key = (road.template, road.width, road.height, road.bg_color)
+    layer = _road_layers.get(key)
+    if layer is None:
+        layer = _road_layers[key] = _render_layer(road, screen)
+    return layer
+
+
+def _render_layer(road, screen):
+    size = (road.width, road.height)
+    if road.bg_color is None:
+        layer = pygame.Surface(size, pygame.SRCALPHA)
+    else:
+        layer = pygame.Surface(size, 0, screen)
+        layer.fill(road.bg_color)
+
+    _draw_roads(layer, road)
+    _draw_center_lines(layer, road)
+    _draw_stop_lines(layer, road)
+    return layer
+
+
+def _draw_roads(screen, road):
+    a = road.geometry.arms
+    cx, cy = road.center_x, road.center_y
+    rw = road.road_width
+
+    if a["N"] and a["S"]:
+        vert_rect = pygame.Rect(cx - rw // 2, 0, rw, road.height)
+        pygame.draw.rect(screen, road.ROAD_COLOR, vert_rect)
+    else:
+        vert_rect = pygame.Rect(
+            cx - rw // 2,
+            cy - rw // 2,
+            rw,
+            road.height - (cy - rw // 2)
+        )
+        pygame.draw.rect(screen, road.ROAD_COLOR, vert_rect)
+
+    if a["W"] or a["E"]:
+        hor_rect = pygame.Rect(0, cy - rw // 2, road.width, rw)
+        pygame.draw.rect(screen, road.ROAD_COLOR, hor_rect)
+
+
+def _draw_center_lines(screen, road):
+    a = road.geometry.arms
+    cx, cy = road.center_x, road.center_y
+    off = road.stop_offset
+    start_gap = road.dash_start_offset
+
+    if a["N"]:
+        _draw_dashes_vertical(
+            screen, road, x=cx,
+            y_start=cy - off - start_gap,
+            y_end=0,
+            direction=-1
+        )
+    if a["S"]:
+        _draw_dashes_vertical(
+            screen, road, x=cx,
+            y_start=cy + off + start_gap,
+            y_end=road.height,
+            direction=1
+        )
+    if a["W"]:
+        _draw_dashes_horizontal(
+            screen, road, y=cy,
+            x_start=cx - off - start_gap,
+            x_end=0,
+            direction=-1
+        )
+    if a["E"]:
+        _draw_dashes_horizontal(
+            screen, road, y=cy,
+            x_start=cx + off + start_gap,
+            x_end=road.width,
+            direction=1
+        )
+
+
+def _draw_dashes_vertical(screen, road, x, y_start, y_end, direction):
+    step = road.dash_len + road.dash_gap
+    y = y_start
+
+    if direction == -1:
+        cond = lambda yy: yy > y_end
+    else:
+        cond = lambda yy: yy < y_end
+
+    while cond(y):
+        y2 = y + direction * road.dash_len
+        pygame.draw.line(screen, road.LINE_COLOR, (x, y), (x, y2), 3)
+        y += direction * step
+
+
+def _draw_dashes_horizontal(screen, road, y, x_start, x_end, direction):
+    step = road.dash_len + road.dash_gap
+    x = x_start
+
+    if direction == -1:
+        cond = lambda xx: xx > x_end
+    else:
+        cond = lambda xx: xx < x_end
+
+    while cond(x):
+        x2 = x + direction * road.dash_len
+        pygame.draw.line(screen, road.LINE_COLOR, (x, y), (x2, y), 3)
+        x += direction * step
+
+
+def _draw_stop_lines(screen, road):
+    a = road.geometry.arms
+    cx, cy = road.center_x, road.center_y
+    rw = road.road_width
+
+    half_len = int((rw * road.STOP_LINE_LENGTH_K) / 2)
+    t = road.STOP_LINE_THICKNESS
+    off = road.stop_offset
+
+    if a["N"]:
+        pygame.draw.line(
+            screen, road.STOP_LINE_COLOR,
+            (cx - half_len, cy - off),
+            (cx + half_len, cy - off),
+            t
+        )
+    if a["S"]:
+        pygame.draw.line(
+            screen, road.STOP_LINE_COLOR,
+            (cx - half_len, cy + off),
+            (cx + half_len, cy + off),
+            t
+        )
+    if a["W"]:
+        pygame.draw.line(
+            screen, road.STOP_LINE_COLOR,
+            (cx - off, cy - half_len),
+            (cx - off, cy + half_len),
+            t
+        )
+    if a["E"]:
+        pygame.draw.line(
+            screen, road.STOP_LINE_COLOR,
+            (cx + off, cy - half_len),
+            (cx + off, cy + half_len),
+            t
+        )
@@ -0,0 +1,119 @@
+import json
+import struct
+import zlib
+
+from demand import demand_from_config
+
+
+MAGIC = b"MTGR"
+VERSION = 2
+
+# version 1 stored only the seed and template; version 2 appends the game
+# settings (control strategy, phase timings, demand model) as JSON
+HEADER_V1 = struct.Struct("<4sBQB")
+HEADER = struct.Struct("<4sBQBH")
+FRAME = struct.Struct("<dB")
+
+DEFAULT_SETTINGS = {"controller": "fixed", "phase_timings": None, "demand": None}
+
+
+class Replay:
+    def __init__(self, seed, template, frames, settings=None):
+        self.seed = seed
+        self.template = template
+        self.frames = frames
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+
+    def to_bytes(self):
+        template = self.template.encode("ascii")
+        settings = json.dumps(self.settings, separators=(",", ":")).encode("utf-8")
+        header = HEADER.pack(MAGIC, VERSION, self.seed, len(template), len(settings))
+        header += template + settings
+
+        body = bytearray()
+        for dt, commands in self.frames:
+            body += FRAME.pack(dt, len(commands))
+            body += bytes(commands)
+        return header + zlib.compress(bytes(body), 9)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version = data[:4], data[4]
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError("not a replay file (or an unsupported version)")
+
+        if version == 1:
+            _, _, seed, template_len = HEADER_V1.unpack_from(data)
+            settings_len = 0
+            offset = HEADER_V1.size
+        else:
+            _, _, seed, template_len, settings_len = HEADER.unpack_from(data)
+            offset = HEADER.size
+        template = data[offset:offset + template_len].decode("ascii")
+        offset += template_len
+        settings = json.loads(data[offset:offset + settings_len]) if settings_len else None
+        body = zlib.decompress(data[offset + settings_len:])
+
+        frames = []
+        pos = 0
+        while pos < len(body):
+            dt, count = FRAME.unpack_from(body, pos)
+            pos += FRAME.size
+            frames.append((dt, tuple(body[pos:pos + count])))
+            pos += count
+        return cls(seed, template, frames, settings)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def play(self, game):
+        settings = self.settings
+        game.controller_strategy = settings["controller"]
+        timings = settings["phase_timings"]
+        game.phase_timings = tuple(timings) if timings is not None else None
+        game.demand = demand_from_config(settings["demand"])
+        game.build_intersection(self.template)
+        game.reset(seed=self.seed)
+
+        for dt, commands in self.frames:
+            for code in commands:
+                game.commands[code].execute()
+            game.update_playing(dt)
+            if game.game_over:
+                break
+        return game.outcome
+
+
+class ReplayRecorder:
+    def __init__(self):
+        self.seed = None
+        self.template = None
+        self.settings = None
+        self.frames = []
+        self._pending = []
+
+    def begin(self, seed, template, settings=None):
+        self.seed = seed
+        self.template = template
+        self.settings = settings
+        self.frames = []
+        self._pending = []
+
+    def command(self, code):
+        self._pending.append(code)
+
+    def frame(self, dt):
+        self.frames.append((dt, tuple(self._pending)))
+        self._pending.clear()
+
+    def replay(self):
+        return Replay(self.seed, self.template, list(self.frames), self.settings)
+
+    def save(self, path):
+        self.replay().save(path)
@@ -1,4 +1,69 @@
-import pygame
+from types import MappingProxyType
+
+from vehicles import FORWARD_ARM, SIGN
+
+
+TEMPLATE_ARMS = {
+    "cross": {"N": True, "S": True, "W": True, "E": True},
+    "t": {"N": False, "S": True, "W": True, "E": True},
+}
+
+class RoadGeometry:
+    STOP_MARGIN = 10
+    PASS_MARGIN = 2
+    SPAWN_MARGIN = 50
+
+    _cache = {}
+
+    def __init__(self, template, width, height, road_width, stop_offset):
+        self.template = template
+        self.arms = MappingProxyType(dict(TEMPLATE_ARMS.get(template, TEMPLATE_ARMS["cross"])))
+        self.allowed = tuple(d for d, ok in self.arms.items() if ok)
+
+        cx, cy = width // 2, height // 2
+        off = stop_offset
+        lane = (road_width // 2) / 2
+        centre = (cy, cy, cx, cx)
+
+        # thresholds are in "progress" form: sign * coordinate, so every
+        # direction compares with >= against its own entry
+        self.stop_lines = (cy - off, cy + off, cx - off, cx + off)
+        self.stop_at = tuple(SIGN[d] * (line - SIGN[d] * self.STOP_MARGIN)
+                             for d, line in enumerate(self.stop_lines))
+        self.pass_at = tuple(SIGN[d] * (line + SIGN[d] * self.PASS_MARGIN)
+                             for d, line in enumerate(self.stop_lines))
+        self.turn_at = tuple(SIGN[d] * c for d, c in enumerate(centre))
+        # the far side of the box: a vehicle has cleared it once its rear is past
+        self.exit_at = tuple(SIGN[d] * self.stop_lines[d ^ 1] for d in range(4))
+
+        # lane centre line for each heading: x for N/S, y for W/E
+        self.lane_pos = (cx - lane, cx + lane, cy + lane, cy - lane)
+
+        m = self.SPAWN_MARGIN
+        self.spawn = MappingProxyType({
+            "N": (self.lane_pos[0], -m),
+            "S": (self.lane_pos[1], height + m),
+            "W": (-m, self.lane_pos[2]),
+            "E": (width + m, self.lane_pos[3]),
+        })
+
+        options = []
+        for d in range(4):
+            if self.arms.get(FORWARD_ARM[d], True):
+                options.append(())
+            elif d < 2:
+                options.append(tuple(t for t, arm in (("E", "W"), ("W", "E")) if self.arms.get(arm)))
+            else:
+                options.append(tuple(t for t, arm in (("S", "N"), ("N", "S")) if self.arms.get(arm)))
+        self.turn_options = tuple(options)
+
+    @classmethod
+    def compile(cls, road):
+        key = (road.template, road.width, road.height, road.road_width, road.stop_offset)
+        geometry = cls._cache.get(key)
+        if geometry is None:
+            geometry = cls._cache[key] = cls(*key)
+        return geometry
 
 
 class Road:
@@ -9,10 +74,11 @@ class Road:
     STOP_LINE_THICKNESS = 7
     STOP_LINE_LENGTH_K = 0.95
 
-    def __init__(self, width, height, template="cross"):
+    def __init__(self, width, height, template="cross", bg_color=None):
         self.width = width
         self.height = height
         self.template = template
+        self.bg_color = bg_color
 
         self.road_width = 220
         self.lane_width = self.road_width // 2
@@ -25,148 +91,25 @@ class Road:
         self.stop_offset = self.road_width // 2 + 15
         self.dash_start_offset = 12
 
-    def draw(self, screen):
-        self._draw_roads(screen)
-        self._draw_center_lines(screen)
-        self._draw_stop_lines(screen)
-
-    def _draw_roads(self, screen):
-        a = self.arms()
-        cx, cy = self.center_x, self.center_y
-        rw = self.road_width
-
-        if a["N"] and a["S"]:
-            vert_rect = pygame.Rect(cx - rw // 2, 0, rw, self.height)
-            pygame.draw.rect(screen, self.ROAD_COLOR, vert_rect)
-        else:
-            vert_rect = pygame.Rect(
-                cx - rw // 2,
-                cy - rw // 2,
-                rw,
-                self.height - (cy - rw // 2)
-            )
-            pygame.draw.rect(screen, self.ROAD_COLOR, vert_rect)
-
-        if a["W"] or a["E"]:
-            hor_rect = pygame.Rect(0, cy - rw // 2, self.width, rw)
-            pygame.draw.rect(screen, self.ROAD_COLOR, hor_rect)
-
-    def _draw_center_lines(self, screen):
-        a = self.arms()
-        cx, cy = self.center_x, self.center_y
-        off = self.stop_offset
-        start_gap = self.dash_start_offset
-
-        if a["N"]:
-            self._draw_dashes_vertical(
-                screen, x=cx,
-                y_start=cy - off - start_gap,
-                y_end=0,
-                direction=-1
-            )
-        if a["S"]:
-            self._draw_dashes_vertical(
-                screen, x=cx,
-                y_start=cy + off + start_gap,
-                y_end=self.height,
-                direction=1
-            )
-        if a["W"]:
-            self._draw_dashes_horizontal(
-                screen, y=cy,
-                x_start=cx - off - start_gap,
-                x_end=0,
-                direction=-1
-            )
-        if a["E"]:
-            self._draw_dashes_horizontal(
-                screen, y=cy,
-                x_start=cx + off + start_gap,
-                x_end=self.width,
-                direction=1
-            )
-
-    def _draw_dashes_vertical(self, screen, x, y_start, y_end, direction):
-        step = self.dash_len + self.dash_gap
-        y = y_start
-
-        if direction == -1:
-            cond = lambda yy: yy > y_end
-        else:
-            cond = lambda yy: yy < y_end
-
-        while cond(y):
-            y2 = y + direction * self.dash_len
-            pygame.draw.line(screen, self.LINE_COLOR, (x, y), (x, y2), 3)
-            y += direction * step
-
-    def _draw_dashes_horizontal(self, screen, y, x_start, x_end, direction):
-        step = self.dash_len + self.dash_gap
-        x = x_start
-
-        if direction == -1:
-            cond = lambda xx: xx > x_end
-        else:
-            cond = lambda xx: xx < x_end
-
-        while cond(x):
-            x2 = x + direction * self.dash_len
-            pygame.draw.line(screen, self.LINE_COLOR, (x, y), (x2, y), 3)
-            x += direction * step
-
-    def _draw_stop_lines(self, screen):
-        a = self.arms()
-        cx, cy = self.center_x, self.center_y
-        rw = self.road_width
-
-        half_len = int((rw * self.STOP_LINE_LENGTH_K) / 2)
-        t = self.STOP_LINE_THICKNESS
-        off = self.stop_offset
-
-        if a["N"]:
-            pygame.draw.line(
-                screen, self.STOP_LINE_COLOR,
-                (cx - half_len, cy - off),
-                (cx + half_len, cy - off),
-                t
-            )
-        if a["S"]:
-            pygame.draw.line(
-                screen, self.STOP_LINE_COLOR,
-                (cx - half_len, cy + off),
-                (cx + half_len, cy + off),
-                t
-            )
-        if a["W"]:
-            pygame.draw.line(
-                screen, self.STOP_LINE_COLOR,
-                (cx - off, cy - half_len),
-                (cx - off, cy + half_len),
-                t
-            )
-        if a["E"]:
-            pygame.draw.line(
-                screen, self.STOP_LINE_COLOR,
-                (cx + off, cy - half_len),
-                (cx + off, cy + half_len),
-                t
-            )
+        self._geometry = None
+
+    @property
+    def geometry(self):
+        geometry = self._geometry
+        if geometry is None or geometry.template != self.template:
+            geometry = self._geometry = RoadGeometry.compile(self)
+        return geometry
 
     def intersection_rect(self):
         size = self.road_width
-        return pygame.Rect(
+        return (
             self.center_x - size // 2,
             self.center_y - size // 2,
             size, size
         )
 
     def arms(self):
-        if self.template == "cross":
-            return {"N": True, "S": True, "W": True, "E": True}
-        if self.template == "t":
-            return {"N": False, "S": True, "W": True, "E": True}
-        return {"N": True, "S": True, "W": True, "E": True}
+        return self.geometry.arms
 
     def allowed_directions(self):
-        a = self.arms()
-        return [d for d, ok in a.items() if ok]
\ No newline at end of file
+        return self.geometry.allowed
\ No newline at end of file
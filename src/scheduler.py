@@ -0,0 +1,272 @@
+from functools import reduce
+from itertools import repeat
+from operator import add
+
+from lanes import LANE_SIGN
+from vehicles import SIGN, VELOCITY, WEST
+
+
+INF = float("inf")
+
+# a pixel of slack per rect edge for the int() truncation in Vehicle.rect()
+RECT_SLACK = 2
+OFF_SCREEN = 80
+
+
+def _overlap_window(r0, rate, reach):
+    # times t >= 0 where |r0 + rate * t| < reach, as (start, end)
+    if rate == 0:
+        return (0.0, INF) if abs(r0) < reach else None
+    a = (-reach - r0) / rate
+    b = (reach - r0) / rate
+    if a > b:
+        a, b = b, a
+    if b <= 0:
+        return None
+    return max(a, 0.0), b
+
+
+class EventScheduler:
+    # upper bound on frames skipped at once, so a round with no pending
+    # event (e.g. WIN_TIME = inf and nobody on the road) still returns
+    MAX_SKIP = 120 * 60
+
+    def __init__(self, game):
+        if game.store is not None:
+            raise ValueError("event-driven stepping needs the object vehicle engine")
+        self.game = game
+        self.skipped = 0
+        self.full = 0
+
+    def step(self, dt):
+        # advance through every idle frame before the next event, then run
+        # that frame in full; returns the number of frames advanced
+        game = self.game
+        if game.game_over:
+            return 0
+
+        frames = self.idle_frames(dt)
+        if frames:
+            self.skip(frames, dt)
+        game.update_playing(dt)
+        self.full += 1
+        return frames + 1
+
+    def idle_frames(self, dt):
+        t = self.time_to_event(2 * dt)
+        if t == INF:
+            return self.MAX_SKIP
+        # one frame of margin for the float drift of accumulated timers
+        return max(0, min(self.MAX_SKIP, int(t / dt) - 1))
+
+    def time_to_event(self, horizon=0.0):
+        # seconds until the first frame that could change anything discrete:
+        # a phase change, spawn tick or demand arrival, win, lane jam, a queued
+        # arrival finding room, a vehicle reaching a stop line, pass line, turn
+        # point or the screen edge, two vehicles crossing a following or yield
+        # distance, or two rects meeting inside the intersection. Returns as
+        # soon as it drops to `horizon`.
+        game = self.game
+        controller = game.controller
+        waits = game.lanes.waits
+
+        if game.demand is None:
+            spawn = game.spawn_interval - game.spawn_timer
+        else:
+            spawn = game.demand.time_to_arrival(game)
+        t = min(
+            controller.strategy.time_to_change(controller),
+            spawn,
+            game.WIN_TIME - game.time_survived,
+        )
+        if game.LANE_JAM is not None:
+            t = min(t, waits.time_to_jam(*game.LANE_JAM))
+        if t <= horizon or not game.vehicles:
+            return t
+
+        game.lanes.emergency.refresh()
+        speeds = {}
+        for v in game.vehicles:
+            t = min(t, self._vehicle_event(v, speeds))
+            if t <= horizon:
+                return t
+
+        if game.backlog:
+            t = min(t, self._entry_events(speeds))
+            if t <= horizon:
+                return t
+
+        t = min(t, self._lane_events(speeds, horizon))
+        if t <= horizon:
+            return t
+        return min(t, self._contact_events(speeds, horizon))
+
+    def _vehicle_event(self, v, speeds):
+        game = self.game
+        if v.blocked:
+            speeds[v] = 0.0
+            return INF
+
+        stopped = v._should_stop(game)
+        yielding = not stopped and not v.priority and v._should_yield(game)
+        stopped = stopped or yielding
+        if stopped != v._should_stop_cached or yielding != v.yielding:
+            return 0.0
+        if stopped:
+            speeds[v] = 0.0
+            return INF
+
+        speed = v.SPEED
+        speeds[v] = speed
+        geo = game.road.geometry
+        d = v.dir
+        coord = v.y if d < WEST else v.x
+        progress = SIGN[d] * coord
+
+        if SIGN[d] > 0:
+            edge = (game.HEIGHT if d < WEST else game.WIDTH) + OFF_SCREEN
+        else:
+            edge = OFF_SCREEN
+        t = (edge - progress) / speed
+
+        if not v.turn_triggered:
+            if v.turn_target_dir is not None:
+                t = min(t, (geo.turn_at[d] - progress) / speed)
+            elif geo.turn_options[d]:
+                return 0.0
+
+        if not v.passed_stop:
+            t = min(t, (geo.pass_at[d] - progress) / speed)
+            if not v.priority and game.controller.stops[d]:
+                t = min(t, (geo.stop_at[d] - v.SIZE[1] / 2 - progress) / speed)
+        return max(t, 0.0)
+
+    def _entry_events(self, speeds):
+        # a queued arrival enters once the lane's rearmost vehicle has moved
+        # SPAWN_GAP clear of the spawn point
+        game = self.game
+        t = INF
+        for direction, waiting in game.spawn_backlog.items():
+            if not waiting:
+                continue
+            missing = game.SPAWN_GAP - game.entry_gap(direction)
+            if missing <= 0:
+                return 0.0
+            speed = speeds[game.lanes.lanes[direction][-1]]
+            if speed:
+                t = min(t, missing / speed)
+        return t
+
+    def _lane_events(self, speeds, horizon):
+        # following and yielding both depend on the progress gap between two
+        # vehicles of one heading crossing 0, MIN_GAP or YIELD_DIST
+        game = self.game
+        min_gap = game.lanes.MIN_GAP
+        t = INF
+        for direction, lane in game.lanes.lanes.items():
+            if len(lane) < 2:
+                continue
+            vertical = direction in ("N", "S")
+            sign = LANE_SIGN[direction]
+            rows = [(sign * (v.y if vertical else v.x), speeds[v], v.YIELD_DIST) for v in lane]
+            for i, (p, s, yield_dist) in enumerate(rows):
+                for q, r, _ in rows[i + 1:]:
+                    rate = s - r
+                    if rate == 0:
+                        continue
+                    gap = p - q
+                    for c in (0.0, min_gap, -min_gap, yield_dist, -yield_dist):
+                        hit = (c - gap) / rate
+                        if 0 <= hit < t:
+                            t = hit
+                    if t <= horizon:
+                        return t
+        return t
+
+    def _contact_events(self, speeds, horizon):
+        game = self.game
+        bx, by, bw, bh = game.collisions.bounds
+        bcx = bx + bw / 2
+        bcy = by + bh / 2
+
+        moving = []
+        for v in game.vehicles:
+            w, h = v.SIZE
+            if v.dir >= WEST:
+                w, h = h, w
+            dx, dy = VELOCITY[v.dir]
+            s = speeds[v]
+            hw = w / 2 + RECT_SLACK
+            hh = h / 2 + RECT_SLACK
+            inside_x = _overlap_window(v.x - bcx, dx * s, hw + bw / 2)
+            inside_y = _overlap_window(v.y - bcy, dy * s, hh + bh / 2)
+            if inside_x is None or inside_y is None:
+                continue
+            start = max(inside_x[0], inside_y[0])
+            end = min(inside_x[1], inside_y[1])
+            if start < end:
+                moving.append((v.x, v.y, dx * s, dy * s, hw, hh, start, end))
+
+        t = INF
+        for i, (ax, ay, avx, avy, ahw, ahh, a0, a1) in enumerate(moving):
+            for bx_, by_, bvx, bvy, bhw, bhh, b0, b1 in moving[i + 1:]:
+                over_x = _overlap_window(ax - bx_, avx - bvx, ahw + bhw)
+                if over_x is None:
+                    continue
+                over_y = _overlap_window(ay - by_, avy - bvy, ahh + bhh)
+                if over_y is None:
+                    continue
+                start = max(over_x[0], over_y[0], a0, b0)
+                end = min(over_x[1], over_y[1], a1, b1)
+                if start < end and start < t:
+                    t = start
+                    if t <= horizon:
+                        return t
+        return t
+
+    def skip(self, frames, dt):
+        # replay `frames` idle frames with the same sequence of float additions
+        # the full update would make (reduce runs the loop in C), so positions
+        # and timers stay bit-identical to fixed stepping
+        game = self.game
+        if game.recorder is not None:
+            for _ in range(frames):
+                game.recorder.frame(dt)
+
+        ticks = repeat(dt, frames)
+        waits = game.lanes.waits
+        controller = game.controller
+        waits.time = reduce(add, ticks, waits.time)
+        ticks = repeat(dt, frames)
+        game.sim_time = reduce(add, ticks, game.sim_time)
+        ticks = repeat(dt, frames)
+        controller.timer = reduce(add, ticks, controller.timer)
+        ticks = repeat(dt, frames)
+        game.spawn_timer = reduce(add, ticks, game.spawn_timer)
+        ticks = repeat(dt, frames)
+        game.time_survived = reduce(add, ticks, game.time_survived)
+
+        interpolate = game.interpolate
+        for v in game.vehicles:
+            if v.blocked or v._should_stop_cached:
+                if interpolate:
+                    v.prev_x = v.x
+                    v.prev_y = v.y
+                continue
+            # the cross-axis coordinate only ever gets 0.0 added
+            vertical = v.dir < WEST
+            step = VELOCITY[v.dir][vertical] * (v.SPEED * dt)
+            if vertical:
+                before = reduce(add, repeat(step, frames - 1), v.y)
+                if interpolate:
+                    v.prev_x = v.x
+                    v.prev_y = before
+                v.y = before + step
+            else:
+                before = reduce(add, repeat(step, frames - 1), v.x)
+                if interpolate:
+                    v.prev_x = before
+                    v.prev_y = v.y
+                v.x = before + step
+
+        self.skipped += frames
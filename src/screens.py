@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
-import pygame
-from ui_button import Button
+from text_cache import render_text
+
+# pygame (and the pygame-backed Button) are imported where they are used, so a
+# headless game can drive PlayScreen/OverScreen without loading pygame at all
 
 
 class Screen(ABC):
@@ -24,6 +26,8 @@ class MenuScreen(Screen):
         self._built = False
 
     def _build(self, game):
+        from ui_button import Button
+
         btn_w, btn_h = 300, 70
         mx, my = game.WIDTH // 2, game.HEIGHT // 2
 
@@ -40,6 +44,8 @@ class MenuScreen(Screen):
         self._built = True
 
     def handle_events(self, game, events):
+        import pygame
+
         if not self._built:
             self._build(game)
 
@@ -57,13 +63,15 @@ class MenuScreen(Screen):
         pass
 
     def draw(self, game, screen):
+        import pygame
+
         screen.fill(game.BG_COLOR)
 
-        title = game.big_font.render("Šviesoforų meistras", True, (240, 240, 240))
+        title = render_text(game.big_font, "Šviesoforų meistras", True, (240, 240, 240))
         title_rect = title.get_rect(center=(game.WIDTH//2, game.HEIGHT//2 - 170))
         screen.blit(title, title_rect)
 
-        subtitle = game.font.render("Choose intersection type:", True, (200, 200, 200))
+        subtitle = render_text(game.font, "Choose intersection type:", True, (200, 200, 200))
         subtitle_rect = subtitle.get_rect(center=(game.WIDTH//2, game.HEIGHT//2 - 110))
         screen.blit(subtitle, subtitle_rect)
 
@@ -74,20 +82,28 @@ class MenuScreen(Screen):
 
 class PlayScreen(Screen):
     def handle_events(self, game, events):
+        import pygame
+
         for event in events:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
-                    game.next_phase_cmd.execute()
+                    game.issue(game.next_phase_cmd)
+                elif event.key == pygame.K_F3:
+                    game.toggle_profile_overlay()
 
     def update(self, game, dt):
         game.update_playing(dt)
 
     def draw(self, game, screen):
+        if game.renderer is not None and not game.show_profile:
+            return game.renderer.draw(game, screen)
         game.draw_playing(screen)
 
 
 class OverScreen(Screen):
     def handle_events(self, game, events):
+        import pygame
+
         mouse_pos = pygame.mouse.get_pos()
         for event in events:
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
@@ -102,6 +118,8 @@ class OverScreen(Screen):
         pass
 
     def draw(self, game, screen):
+        import pygame
+
         game.draw_playing(screen)
 
         overlay = pygame.Surface((game.WIDTH, game.HEIGHT), pygame.SRCALPHA)
@@ -119,12 +137,12 @@ class OverScreen(Screen):
 
         msg = "YOU WIN!" if game.win else "GAME OVER!"
         color = (80, 220, 120) if game.win else (240, 80, 80)
-        over_text = game.big_font.render(msg, True, color)
+        over_text = render_text(game.big_font, msg, True, color)
         over_rect = over_text.get_rect(center=(game.WIDTH // 2, game.HEIGHT // 2 - 40))
         screen.blit(over_text, over_rect)
 
         sub = f"Time: {game.time_survived:.1f}s"
-        sub_text = game.font.render(sub, True, (220, 220, 220))
+        sub_text = render_text(game.font, sub, True, (220, 220, 220))
         sub_rect = sub_text.get_rect(center=(game.WIDTH // 2, game.HEIGHT // 2 + 5))
         screen.blit(sub_text, sub_rect)
 
@@ -0,0 +1,297 @@
+import argparse
+import json
+import queue
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+from vehicles import DIRECTIONS
+
+
+MAGIC = b"MTGT"
+VERSION = 1
+
+HEADER = struct.Struct("<4sB")
+BLOCK = struct.Struct("<cI")
+TICK_COUNTS = struct.Struct("<II")
+
+TICKS = b"T"
+EVENT = b"E"
+
+# per-row columns of a tick block, after the per-tick times and row counts
+COLUMNS = (
+    ("id", "I"),
+    ("class", "B"),
+    ("dir", "B"),
+    ("x", "f"),
+    ("y", "f"),
+    ("blocked", "B"),
+    ("stopped", "B"),
+    ("yielding", "B"),
+)
+
+
+def _pack(typecode, values):
+    data = array(typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _unpack(typecode, body, offset, count):
+    data = array(typecode)
+    end = offset + data.itemsize * count
+    data.frombytes(body[offset:end])
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data, end
+
+
+class TelemetrySink:
+    # frames are batched into chunks on the simulation thread and handed to a
+    # writer thread through a bounded queue; when the writer falls behind, the
+    # chunk's ticks are dropped (and counted) instead of stalling the frame,
+    # while its round, phase and outcome records carry over to the next chunk,
+    # up to MAX_EVENTS of them (the oldest go first, also counted)
+    CHUNK_TICKS = 120
+    MAX_CHUNKS = 32
+    MAX_EVENTS = 1024
+    COMPRESSION = 1
+
+    def __init__(self, path, every=1, chunk_ticks=CHUNK_TICKS, max_chunks=MAX_CHUNKS,
+                 max_events=MAX_EVENTS):
+        self.path = path
+        self.every = every
+        self.chunk_ticks = chunk_ticks
+        self.max_events = max_events
+        self.ticks = 0
+        self.dropped = 0
+        self.dropped_events = 0
+        self.rounds = 0
+
+        self._frame = 0
+        self._chunk = []
+        self._chunk_ticks = 0
+        self._dropped_pending = 0
+        self._dropped_events_pending = 0
+        self._round_start = None
+        self._controller = None
+        self._game = None
+        self._classes = {}
+        self._queue = queue.Queue(maxsize=max_chunks)
+
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+        self._thread = threading.Thread(target=self._write_loop, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def attach(self, game):
+        controller = game.controller
+        if self._controller is not controller:
+            if self._controller is not None:
+                self._controller.remove_phase_listener(self._phase_changed)
+            controller.add_phase_listener(self._phase_changed)
+            self._controller = controller
+        self._game = game
+
+    def begin_round(self, game):
+        # a round reset before it ever ticked (e.g. the reset in Game.__init__)
+        # leaves no trace
+        if self._round_start is not None:
+            del self._chunk[self._round_start:]
+            self.rounds -= 1
+        self.rounds += 1
+        self._round_start = len(self._chunk)
+        self._chunk.append({"type": "round", "round": self.rounds, "seed": game.round_seed,
+                            "template": game.road.template,
+                            "controller": game.controller_strategy})
+
+    def _phase_changed(self, controller):
+        t = self._game.sim_time if self._game is not None else 0.0
+        v_state, h_state, _ = controller.phases[controller.phase_index]
+        self._chunk.append({"type": "phase", "t": t, "phase": controller.phase_index,
+                            "vertical": v_state.name(), "horizontal": h_state.name()})
+
+    def tick(self, game):
+        self._frame += 1
+        if self._frame % self.every:
+            return
+
+        # raw fields only; the writer thread derives "waiting" and packs columns
+        rows = [(v.uid, type(v), v.dir, v.x, v.y, v.blocked, v._should_stop_cached, v.yielding)
+                for v in game.vehicles]
+        self._chunk.append((game.sim_time, rows))
+        self._round_start = None
+        self.ticks += 1
+        self._chunk_ticks += 1
+        if self._chunk_ticks >= self.chunk_ticks:
+            self.flush()
+
+    def outcome(self, game):
+        self._round_start = None
+        self._chunk.append({"type": "outcome", "t": game.sim_time,
+                            "outcome": game.outcome, "survived": game.time_survived})
+        self.flush()
+
+    def flush(self, block=False):
+        if not self._chunk and not self._dropped_pending and not self._dropped_events_pending:
+            return
+        self._round_start = None
+        chunk = self._chunk
+        if self._dropped_pending or self._dropped_events_pending:
+            chunk.insert(0, {"type": "dropped", "ticks": self._dropped_pending,
+                             "events": self._dropped_events_pending})
+        try:
+            self._queue.put(chunk, block=block)
+        except queue.Full:
+            self.dropped += self._chunk_ticks
+            self._dropped_pending += self._chunk_ticks
+            events = [e for e in chunk if isinstance(e, dict) and e["type"] != "dropped"]
+            excess = len(events) - self.max_events
+            if excess > 0:
+                del events[:excess]
+                self.dropped_events += excess
+                self._dropped_events_pending += excess
+            self._chunk = events
+        else:
+            self._dropped_pending = 0
+            self._dropped_events_pending = 0
+            self._chunk = []
+        self._chunk_ticks = 0
+
+    def close(self):
+        if self._thread is None:
+            return
+        self.flush(block=True)
+        if self._controller is not None:
+            self._controller.remove_phase_listener(self._phase_changed)
+            self._controller = None
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_loop(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                break
+
+            # consecutive ticks share one columnar block; events between
+            # them are written in place so the stream keeps its order
+            out = bytearray()
+            ticks = []
+            for entry in chunk:
+                if isinstance(entry, dict):
+                    if ticks:
+                        out += self._tick_block(ticks)
+                        ticks = []
+                    out += self._event_block(entry)
+                else:
+                    ticks.append(entry)
+            if ticks:
+                out += self._tick_block(ticks)
+            self._file.write(out)
+
+    def _event_block(self, event):
+        payload = json.dumps(event, separators=(",", ":")).encode("utf-8")
+        return BLOCK.pack(EVENT, len(payload)) + payload
+
+    def _tick_block(self, ticks):
+        out = bytearray()
+        rows = [row for _, tick_rows in ticks for row in tick_rows]
+        classes = self._classes
+        for cls in dict.fromkeys(row[1] for row in rows):
+            if cls not in classes:
+                classes[cls] = len(classes)
+                out += self._event_block({"type": "class", "code": classes[cls],
+                                          "name": cls.__name__})
+
+        body = bytearray(TICK_COUNTS.pack(len(ticks), len(rows)))
+        body += _pack("d", [t for t, _ in ticks])
+        body += _pack("I", [len(tick_rows) for _, tick_rows in ticks])
+        if rows:
+            columns = list(zip(*rows))
+            columns[1] = [classes[cls] for cls in columns[1]]
+            for (_, typecode), values in zip(COLUMNS, columns):
+                body += _pack(typecode, values)
+
+        payload = zlib.compress(body, self.COMPRESSION)
+        return out + BLOCK.pack(TICKS, len(payload)) + payload
+
+
+def read_telemetry(path):
+    # yields the round, phase, outcome and dropped records as written and
+    # one columnar {"type": "tick", ...} record per recorded frame
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} telemetry file")
+
+    names = {}
+    pos = HEADER.size
+    while pos < len(data):
+        kind, size = BLOCK.unpack_from(data, pos)
+        pos += BLOCK.size
+        payload = data[pos:pos + size]
+        pos += size
+
+        if kind == EVENT:
+            event = json.loads(payload)
+            if event["type"] == "class":
+                names[event["code"]] = event["name"]
+            else:
+                yield event
+            continue
+
+        body = zlib.decompress(payload)
+        tick_count, row_count = TICK_COUNTS.unpack_from(body)
+        offset = TICK_COUNTS.size
+        times, offset = _unpack("d", body, offset, tick_count)
+        counts, offset = _unpack("I", body, offset, tick_count)
+        columns = {}
+        for name, typecode in COLUMNS:
+            columns[name], offset = _unpack(typecode, body, offset, row_count)
+
+        start = 0
+        for t, n in zip(times, counts):
+            end = start + n
+            blocked = [bool(b) for b in columns["blocked"][start:end]]
+            stopped = columns["stopped"][start:end]
+            yield {
+                "type": "tick",
+                "t": t,
+                "id": columns["id"][start:end].tolist(),
+                "class": [names[c] for c in columns["class"][start:end]],
+                "dir": [DIRECTIONS[d] for d in columns["dir"][start:end]],
+                "x": columns["x"][start:end].tolist(),
+                "y": columns["y"][start:end].tolist(),
+                "blocked": blocked,
+                "waiting": [b or bool(s) for b, s in zip(blocked, stopped)],
+                "yielding": [bool(y) for y in columns["yielding"][start:end]],
+            }
+            start = end
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Dump a telemetry file as newline-delimited JSON")
+    parser.add_argument("path")
+    parser.add_argument("--ticks", action="store_true", help="include per-frame vehicle records")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for record in read_telemetry(args.path):
+        if args.ticks or record["type"] != "tick":
+            print(json.dumps(record))
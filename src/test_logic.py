@@ -1,13 +1,32 @@
 import os, sys
 sys.path.append(os.path.dirname(__file__))
 
+import random
+import subprocess
+import tempfile
+import threading
 import unittest
+import zlib
+from collections import deque
 from unittest.mock import patch
 
 from traffic_light import RedState, RedYellowState, GreenState, YellowState, TrafficLight
-from controller import IntersectionController
+from controller import IntersectionController, MaxPressureStrategy
 from road import Road
-from vehicles import Car, VehicleFactory
+from vehicles import Car, Ambulance, PoliceCar, VehicleFactory
+from collision import CollisionGrid, brute_force_first_collision, overlaps
+from lanes import LaneQueues
+from main import Game
+from replay import HEADER_V1, Replay, ReplayRecorder
+from batch import build_configs, run_batch, write_report
+from profiler import FrameProfiler
+from vehicle_store import np
+from benchmark import build_scenario, compare_to_baseline
+from world import World
+from scheduler import EventScheduler
+from parallel import ParallelWorld
+from telemetry import TelemetrySink, read_telemetry
+from demand import DemandCurve, PoissonDemand
 
 
 class DummyGame:
@@ -39,6 +58,8 @@ class DummyGame:
         self.controller = IntersectionController(vertical, horizontal)
 
         self.vehicles = []
+        self.lanes = LaneQueues()
+        self.rng = random.Random(0)
 
 
 class TestTrafficLightStates(unittest.TestCase):
@@ -59,6 +80,12 @@ class TestTrafficLightStates(unittest.TestCase):
         self.assertEqual(GreenState().name(), "GREEN")
         self.assertEqual(YellowState().name(), "YELLOW")
 
+    def test_states_are_shared_singletons(self):
+        self.assertIs(RedState(), RedState())
+        self.assertIs(RedState().next_state(), RedYellowState())
+        self.assertEqual(sorted(s.CODE for s in (RedState(), RedYellowState(), GreenState(), YellowState())),
+                         [0, 1, 2, 3])
+
 
 class TestIntersectionController(unittest.TestCase):
 
@@ -74,6 +101,104 @@ class TestIntersectionController(unittest.TestCase):
         after_v = game.controller.get_group_state("vertical")
         self.assertNotEqual(before_v, after_v)
 
+    def test_stop_lookup_follows_lights(self):
+        game = DummyGame("cross")
+        controller = game.controller
+        self.assertEqual(controller.stops, (False, False, True, True))
+        for l in controller.h_lights:
+            l.set_state(GreenState())
+        self.assertEqual(controller.stops, (False, False, False, False))
+        controller.next_phase()
+        self.assertEqual(controller.stops, (False, False, True, True))
+        self.assertEqual(controller.get_group_state("vertical"), "YELLOW")
+
+    def test_max_pressure_cuts_green_for_queued_cross_traffic(self):
+        lanes = LaneQueues()
+        ctrl = IntersectionController([TrafficLight(0, 0, "vertical")],
+                                      [TrafficLight(0, 0, "horizontal")],
+                                      MaxPressureStrategy(min_green=1.0, max_green=12.0))
+        ctrl.sensors = lanes
+
+        ctrl.update(0.5)
+        self.assertEqual(ctrl.phase_index, 0)
+
+        for i in range(2):
+            car = Car(200 - 50 * i, 405, "W")
+            lanes.add(car)
+            lanes._set_blocked(car, True)
+        ctrl.update(0.4)
+        self.assertEqual(ctrl.phase_index, 0)  # still inside min_green
+
+        ctrl.update(0.2)
+        self.assertEqual(ctrl.phase_index, 1)
+        self.assertEqual(ctrl.get_group_state("vertical"), "YELLOW")
+
+        ctrl.update(1.0)
+        self.assertEqual(ctrl.phase_index, 1)  # yellow keeps its full duration
+        ctrl.update(0.6)
+        self.assertEqual(ctrl.phase_index, 2)
+
+    def test_max_pressure_holds_green_up_to_max(self):
+        lanes = LaneQueues()
+        ctrl = IntersectionController([TrafficLight(0, 0, "vertical")],
+                                      [TrafficLight(0, 0, "horizontal")],
+                                      MaxPressureStrategy(min_green=1.0, max_green=6.0))
+        ctrl.sensors = lanes
+        lanes.add(Car(395, 100, "N"))
+
+        for _ in range(11):
+            ctrl.update(0.5)
+        self.assertEqual(ctrl.phase_index, 0)
+        ctrl.update(0.5)
+        self.assertEqual(ctrl.phase_index, 1)
+
+    def test_max_pressure_only_counts_vehicles_in_the_detection_zone(self):
+        road = Road(900, 700)
+        lanes = LaneQueues()
+        ctrl = IntersectionController.for_road(road, MaxPressureStrategy())
+        ctrl.sensors = lanes
+        x, y = road.geometry.spawn["W"]
+        lanes.add(Car(x, y, "W"))
+        self.assertEqual(ctrl.strategy.pressure(ctrl, "horizontal"), 0)
+        lanes.add(Car(road.geometry.stop_at[2] - 50, y, "W"))
+        self.assertEqual(ctrl.strategy.pressure(ctrl, "horizontal"), 1)
+
+    def test_max_pressure_ignores_vehicles_blocked_past_the_stop_line(self):
+        road = Road(900, 700)
+        lanes = LaneQueues()
+        ctrl = IntersectionController.for_road(road, MaxPressureStrategy())
+        ctrl.sensors = lanes
+        y = road.geometry.spawn["W"][1]
+        inside = Car(road.center_x, y, "W")
+        inside.passed_stop = True
+        lanes.add(inside)
+        lanes._set_blocked(inside, True)
+        self.assertEqual(lanes.waits.queue_length("W"), 1)
+        self.assertEqual(ctrl.strategy.pressure(ctrl, "horizontal"), 0)
+
+        queued = Car(road.geometry.stop_at[2] - 50, y, "W")
+        lanes.add(queued)
+        lanes._set_blocked(queued, True)
+        self.assertEqual(ctrl.strategy.pressure(ctrl, "horizontal"), 3)
+
+    def test_max_pressure_red_yellow_waits_for_an_empty_box(self):
+        road = Road(900, 700)
+        lanes = LaneQueues()
+        strategy = MaxPressureStrategy(max_clearance=0.5)
+        ctrl = IntersectionController.for_road(road, strategy)
+        ctrl.sensors = lanes
+        ctrl.phase_index = 2  # vertical red, horizontal red-yellow
+        ctrl._apply_phase()
+
+        car = Car(road.geometry.lane_pos[0], road.center_y, "N")
+        car.passed_stop = True
+        lanes.add(car)
+        ctrl.update(1.2)
+        self.assertEqual(ctrl.phase_index, 2)
+        car.y += 200
+        ctrl.update(0.01)
+        self.assertEqual(ctrl.phase_index, 3)
+
 
 class TestRoadTemplates(unittest.TestCase):
 
@@ -85,6 +210,22 @@ class TestRoadTemplates(unittest.TestCase):
         road = Road(900, 700, template="t")
         self.assertCountEqual(road.allowed_directions(), ["S", "W", "E"])
 
+    def test_geometry_compiled_once_per_template(self):
+        road = Road(900, 700, template="t")
+        geo = road.geometry
+        self.assertIs(Road(900, 700, template="t").geometry, geo)
+        with self.assertRaises(TypeError):
+            geo.arms["N"] = True
+
+        off = road.stop_offset
+        self.assertEqual(geo.stop_lines, (350 - off, 350 + off, 450 - off, 450 + off))
+        self.assertEqual(geo.turn_options[1], ("E", "W"))
+        self.assertEqual(geo.turn_options[2], ())
+        self.assertEqual(geo.spawn["W"], (-50, 350 + road.lane_width / 2))
+
+        road.template = "cross"
+        self.assertEqual(road.geometry.turn_options[1], ())
+
 
 class TestVehiclesLogic(unittest.TestCase):
 
@@ -121,14 +262,13 @@ class TestVehiclesLogic(unittest.TestCase):
         car.update(0.2, game)
         self.assertGreater(car.y, y_before)
 
-    @patch("vehicles.random.random", return_value=0.99)
-    def test_factory_creates_car_when_random_high(self, _):
+    def test_factory_creates_car_when_random_high(self):
         game = DummyGame("cross")
-        v = VehicleFactory.create("N", game)
+        with patch.object(game.rng, "random", return_value=0.99):
+            v = VehicleFactory().create("N", game)
         self.assertIsInstance(v, Car)
 
-    @patch("vehicles.random.choice", return_value="W")
-    def test_turn_in_t_intersection(self, _):
+    def test_turn_in_t_intersection(self):
         game = DummyGame("t")
         cx, cy = game.road.center_x, game.road.center_y
         lane = game.road.lane_width / 2
@@ -139,11 +279,701 @@ class TestVehiclesLogic(unittest.TestCase):
         for l in game.controller.v_lights:
             l.set_state(GreenState())
 
-        for _ in range(10):
-            car.update(0.2, game)
+        with patch.object(game.rng, "choice", return_value="W"):
+            for _ in range(10):
+                car.update(0.2, game)
 
         self.assertIn(car.direction, ("W", "E"))
 
+    def test_factory_reuses_released_vehicles(self):
+        game = DummyGame("cross")
+        factory = VehicleFactory()
+        with patch.object(game.rng, "random", return_value=0.99):
+            old = factory.create("N", game)
+            old.alive = False
+            old.passed_stop = True
+            factory.release(old)
+
+            v = factory.create("E", game)
+
+        self.assertIs(v, old)
+        self.assertTrue(v.alive)
+        self.assertFalse(v.passed_stop)
+        self.assertEqual(v.direction, "E")
+        self.assertFalse(hasattr(v, "__dict__"))
+
+    def test_games_do_not_share_released_vehicles(self):
+        first = Game("cross", headless=True, seed=1)
+        second = Game("cross", headless=True, seed=1)
+        with patch.object(first.rng, "random", return_value=0.99):
+            old = first.spawn_vehicle("N")
+        first.reset()
+
+        with patch.object(second.rng, "random", return_value=0.99):
+            self.assertIsNot(second.spawn_vehicle("N"), old)
+        with patch.object(first.rng, "random", return_value=0.99):
+            self.assertIs(first.spawn_vehicle("N"), old)
+
+
+class TestCollisionGrid(unittest.TestCase):
+
+    def test_grid_matches_pairwise_first_crash(self):
+        road = Road(900, 700, template="cross")
+        inter = road.intersection_rect()
+        left, top, width, height = inter
+        grid = CollisionGrid(inter)
+        rng = random.Random(7)
+
+        for _ in range(200):
+            vehicles = [
+                Car(rng.uniform(left - 60, left + width + 60),
+                    rng.uniform(top - 60, top + height + 60),
+                    rng.choice(("N", "S", "W", "E")))
+                for _ in range(rng.randint(0, 12))
+            ]
+            self.assertEqual(grid.first_collision(vehicles),
+                             brute_force_first_collision(vehicles, inter))
+
+
+class TestLaneQueues(unittest.TestCase):
+
+    @staticmethod
+    def _sorted_blocked(vehicles):
+        groups = {}
+        for v in vehicles:
+            groups.setdefault(v.direction, []).append(v)
+
+        blocked = {}
+        for direction, group in groups.items():
+            key = (lambda c: c.y) if direction in ("N", "S") else (lambda c: c.x)
+            group.sort(key=key, reverse=direction in ("N", "W"))
+            blocked[id(group[0])] = False
+            for front, back in zip(group, group[1:]):
+                blocked[id(back)] = abs(key(front) - key(back)) < 45
+        return blocked
+
+    def test_matches_regroup_and_sort(self):
+        for template in ("cross", "t"):
+            game = Game(template, headless=True, seed=3)
+            game.spawn_interval = 0.3
+            game.JAM_THRESHOLD = 10 ** 9
+            game.WIN_TIME = float("inf")
+            game.collisions.first_collision = lambda vehicles, rects=None: None
+
+            for _ in range(1200):
+                game.update_playing(1 / 60)
+                expected = self._sorted_blocked(game.vehicles)
+                self.assertEqual({id(v): v.blocked for v in game.vehicles}, expected)
+
+            lane_members = sorted(id(v) for lane in game.lanes.lanes.values() for v in lane)
+            self.assertEqual(lane_members, sorted(id(v) for v in game.vehicles))
+
+    def test_wait_tracker_matches_rescan(self):
+        engines = ("object", "numpy") if np is not None else ("object",)
+        for engine in engines:
+            game = Game("t", headless=True, engine=engine, seed=4)
+            game.spawn_interval = 0.3
+            game.JAM_THRESHOLD = 10 ** 9
+            game.WIN_TIME = float("inf")
+            game.collisions.first_collision = lambda vehicles, rects=None: None
+
+            for _ in range(600):
+                game.update_playing(1 / 120)
+                waits = game.lanes.waits
+                self.assertEqual(waits.count, sum(1 for v in game.vehicles if v.is_waiting()))
+                for d, lane in game.lanes.lanes.items():
+                    self.assertEqual(waits.queue_length(d), sum(1 for v in lane if v.is_waiting()))
+
+    def test_lane_jam_needs_length_and_duration(self):
+        lanes = LaneQueues()
+        waits = lanes.waits
+        queue = [Car(395, 200 - 50 * i, "N") for i in range(3)]
+        for v in queue:
+            lanes.add(v)
+
+        lanes._set_blocked(queue[1], True)
+        waits.tick(1.0)
+        lanes._set_blocked(queue[2], True)
+        waits.tick(2.0)
+
+        self.assertEqual(waits.count, 2)
+        self.assertEqual(waits.wait_time(queue[1]), 3.0)
+        self.assertEqual(waits.longest_wait(), 3.0)
+        self.assertTrue(waits.lane_jammed(1, 2.0))
+        self.assertFalse(waits.lane_jammed(1, 2.5))
+        self.assertFalse(waits.lane_jammed(2, 0.0))
+
+        lanes.remove(queue[2])
+        self.assertEqual(waits.queue_length("N"), 1)
+        self.assertFalse(waits.lane_jammed(1, 0.0))
+
+    def test_turned_vehicle_is_inserted_in_order(self):
+        lanes = LaneQueues()
+        ahead, behind = Car(600, 405, "W"), Car(200, 405, "W")
+        lanes.add(ahead)
+        lanes.add(behind)
+
+        turned = Car(505, 405, "S")
+        lanes.add(turned)
+        turned.direction = "W"
+        lanes.move(turned, "S")
+
+        self.assertEqual(list(lanes.lanes["W"]), [ahead, turned, behind])
+        self.assertEqual(len(lanes.lanes["S"]), 0)
+
+    def test_emergency_index_yield_distance(self):
+        game = DummyGame("cross")
+        ambulance = Ambulance(395, 200, "N")
+        near = Car(395, 120, "N")
+        far = Car(395, 100, "N")
+        other_lane = Car(505, 150, "S")
+        for v in (ambulance, near, far, other_lane):
+            game.lanes.add(v)
+
+        self.assertTrue(near._should_yield(game))
+        self.assertFalse(far._should_yield(game))
+        self.assertFalse(other_lane._should_yield(game))
+        self.assertFalse(Car(395, 250, "N")._should_yield(game))
+
+
+class TestReplay(unittest.TestCase):
+
+    def _play(self, game, frames, presses):
+        for i in range(frames):
+            if i in presses:
+                game.issue(game.next_phase_cmd)
+            game.update_playing(1 / 60)
+            if game.game_over:
+                break
+
+    def test_same_seed_same_round(self):
+        a = Game("t", headless=True, seed=11)
+        b = Game("t", headless=True, seed=11)
+        a.run_headless(rounds=5)
+        b.run_headless(rounds=5)
+        self.assertEqual((a.outcome, a.time_survived), (b.outcome, b.time_survived))
+
+    def test_replay_reproduces_round(self):
+        game = Game("cross", headless=True, seed=5)
+        game.recorder = ReplayRecorder()
+        game.reset()
+        self._play(game, 900, presses={30, 200, 201, 450})
+
+        data = game.recorder.replay().to_bytes()
+        replay = Replay.from_bytes(data)
+        self.assertEqual(replay.frames, game.recorder.frames)
+
+        other = Game("t", headless=True, seed=99)
+        outcome = replay.play(other)
+
+        self.assertEqual(outcome, game.outcome)
+        self.assertEqual(other.time_survived, game.time_survived)
+        self.assertEqual([(v.x, v.y, v.direction) for v in other.vehicles],
+                         [(v.x, v.y, v.direction) for v in game.vehicles])
+
+    def test_replay_carries_game_settings(self):
+        demand = PoissonDemand(0.5, DemandCurve.rush_hour(10.0), platoon_prob=0.3, police=0.2)
+        game = Game("cross", headless=True, seed=8, controller="max-pressure",
+                    phase_timings=(3.0, 1.0, 0.8), demand=demand)
+        game.recorder = ReplayRecorder()
+        game.reset()
+        self._play(game, 1200, presses={100, 400})
+
+        replay = Replay.from_bytes(game.recorder.replay().to_bytes())
+        other = Game("t", headless=True, seed=99)
+        self.assertEqual(replay.play(other), game.outcome)
+        self.assertEqual(other.controller_strategy, "max-pressure")
+        self.assertEqual(other.controller.phases[1][2], 1.0)
+        self.assertEqual([(v.x, v.y, v.direction) for v in other.vehicles],
+                         [(v.x, v.y, v.direction) for v in game.vehicles])
+
+    def test_version_1_replays_still_load(self):
+        data = HEADER_V1.pack(b"MTGR", 1, 7, 5) + b"cross" + zlib.compress(b"")
+        replay = Replay.from_bytes(data)
+        self.assertEqual((replay.seed, replay.template, replay.frames), (7, "cross", []))
+        self.assertEqual(replay.settings["controller"], "fixed")
+
+
+class TestBatchRunner(unittest.TestCase):
+
+    def test_grid_results_are_seeded(self):
+        configs = build_configs(["cross", "t"], [3.0, 4.0], [1.5], [1.0], [1.0], [0.7],
+                                rounds=2, seed=10)
+        self.assertEqual(len(configs), 4)
+
+        first = run_batch(configs, workers=1)
+        second = run_batch(configs, workers=1)
+        self.assertEqual(first, second)
+        for result in first:
+            self.assertEqual(result["wins"] + result["jams"] + result["crashes"], 2)
+            self.assertAlmostEqual(result["win_rate"] + result["jam_rate"] + result["crash_rate"], 1.0)
+
+    def test_configurations_share_round_seeds(self):
+        configs = build_configs(["cross"], [3.0, 4.0], [1.5], [1.0], [1.0], [0.7],
+                                rounds=3, seed=10)
+        self.assertEqual({c["seed"] for c in configs}, {10})
+
+    def test_empty_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "report.csv")
+            write_report([], path)
+            with open(path) as f:
+                self.assertEqual(f.read(), "")
+
+    def test_phase_timings_applied(self):
+        game = Game("cross", headless=True, phase_timings=(2.0, 0.5, 0.25))
+        self.assertEqual([dur for _, _, dur in game.controller.phases],
+                         [2.0, 0.5, 0.25, 2.0, 0.5, 0.25])
+
+
+class TestFixedTimestep(unittest.TestCase):
+
+    def _state(self, game):
+        return [(v.x, v.y, v.direction) for v in game.vehicles], game.time_survived
+
+    def test_frame_hitches_do_not_change_the_simulation(self):
+        smooth = Game("cross", headless=True, seed=8)
+        hitchy = Game("cross", headless=True, seed=8)
+        smooth.interpolate = hitchy.interpolate = True
+
+        smooth_steps = sum(smooth.advance(1 / 60) for _ in range(240))
+        hitchy_steps = sum(hitchy.advance(frame_dt)
+                           for frame_dt in [0.05, 0.0, 1 / 30, 0.001, 0.04] * 12)
+        for _ in range(smooth_steps - hitchy_steps):
+            hitchy.update(hitchy.sim_dt)
+
+        self.assertEqual(self._state(smooth), self._state(hitchy))
+        self.assertTrue(0.0 <= hitchy.alpha < 1.0)
+
+    def test_catch_up_is_capped(self):
+        game = Game("cross", headless=True, seed=8)
+        self.assertEqual(game.advance(2.0), Game.MAX_CATCH_UP_STEPS)
+        self.assertLess(game.accumulator, game.sim_dt)
+
+    def test_no_interpolation_after_the_round_ends(self):
+        game = Game("cross", headless=True, seed=8)
+        game.interpolate = True
+        game.advance(0.5 + game.sim_dt / 2)
+        self.assertGreater(game.alpha, 0.0)
+        game.end_round("crash")
+        game.advance(game.sim_dt / 3)
+        self.assertEqual(game.alpha, 1.0)
+
+    def test_interpolated_draw_rect(self):
+        car = Car(100, 200, "W")
+        car.prev_x, car.x = 100.0, 110.0
+        x, y, w, h = car.rect()
+        self.assertEqual(car.draw_rect(0.5), (x - 5, y, w, h))
+        self.assertEqual(car.draw_rect(1.0), car.rect())
+
+
+class TestFrameProfiler(unittest.TestCase):
+
+    def test_percentiles_over_rolling_window(self):
+        prof = FrameProfiler(window=100)
+        prof.samples["stage"] = deque(range(1_000_000, 201_000_000, 1_000_000), maxlen=100)
+
+        stats = prof.stats("stage")
+        self.assertEqual(stats["count"], 100)
+        self.assertEqual(stats["p50_ms"], 150.0)
+        self.assertEqual(stats["p99_ms"], 199.0)
+
+    def test_percentiles_use_nearest_rank(self):
+        prof = FrameProfiler(window=10)
+        prof.samples["stage"] = deque([3_000_000, 1_000_000, 2_000_000], maxlen=10)
+
+        stats = prof.stats("stage")
+        self.assertEqual(stats["p50_ms"], 2.0)
+        self.assertEqual(stats["p95_ms"], 3.0)
+        prof.samples["stage"] = deque([5_000_000], maxlen=10)
+        self.assertEqual(prof.stats("stage")["p50_ms"], 5.0)
+
+    def test_update_stages_recorded_only_when_enabled(self):
+        game = Game("cross", headless=True, seed=1, profile=True)
+        for _ in range(10):
+            game.update_playing(game.sim_dt)
+        self.assertEqual(set(game.profiler.report()),
+                         {"controller", "spawn", "vehicles", "lanes", "collisions", "jam"})
+
+        self.assertIsNone(Game("cross", headless=True).profiler)
+
+
+class TestHeadlessGame(unittest.TestCase):
+
+    def test_headless_rounds_finish(self):
+        game = Game("cross", headless=True)
+        self.assertIsNone(game.screen)
+
+        stats = game.run_headless(rounds=3)
+        self.assertEqual(sum(stats["outcomes"].values()), 3)
+        self.assertGreater(stats["sim_time"], 0)
+        self.assertTrue(game.game_over)
+        self.assertIn(game.outcome, ("crash", "jam", "win"))
+
+    def test_headless_game_does_not_load_pygame(self):
+        code = ("import sys, main, world, batch; "
+                "main.Game('cross', headless=True, seed=1).run_headless(1); "
+                "print('pygame' in sys.modules)")
+        result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(__file__) or ".",
+                                capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), "False", result.stderr)
+
+
+class TestEventScheduler(unittest.TestCase):
+
+    def _round(self, template, controller, seed, event_driven):
+        game = Game(template, headless=True, seed=seed, controller=controller)
+        game.spawn_interval = 3.0
+        game.spawn_prob = 0.6
+        game.reset(seed=seed)
+        scheduler = EventScheduler(game)
+        frames = 0
+        while not game.game_over:
+            if event_driven:
+                frames += scheduler.step(game.sim_dt)
+            else:
+                game.update_playing(game.sim_dt)
+                frames += 1
+        vehicles = [(type(v).__name__, v.x, v.y, v.direction) for v in game.vehicles]
+        return (game.outcome, game.time_survived, frames, vehicles), scheduler
+
+    def test_matches_fixed_stepping(self):
+        for template, controller in (("cross", "fixed"), ("t", "max-pressure")):
+            for seed in range(4):
+                fixed, _ = self._round(template, controller, seed, False)
+                events, scheduler = self._round(template, controller, seed, True)
+                self.assertEqual(fixed, events)
+                self.assertLess(scheduler.full * 4, fixed[2])
+
+    def test_numpy_engine_is_rejected(self):
+        if np is None:
+            self.skipTest("numpy not installed")
+        with self.assertRaises(ValueError):
+            EventScheduler(Game("cross", headless=True, engine="numpy"))
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".tel")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def test_round_trip(self):
+        game = Game("cross", headless=True, seed=4, telemetry_path=self.path)
+        game.run_headless(rounds=1)
+        last = [(v.uid, type(v).__name__, v.direction, v.blocked, v.is_waiting(), v.yielding)
+                for v in game.vehicles]
+        game.telemetry.close()
+
+        records = list(read_telemetry(self.path))
+        ticks = [r for r in records if r["type"] == "tick"]
+        self.assertEqual([r["type"] for r in records if r["type"] == "round"], ["round"])
+        self.assertEqual(records[-1]["outcome"], game.outcome)
+        self.assertEqual(len(ticks), game.telemetry.ticks)
+        self.assertTrue(any(r["type"] == "phase" for r in records))
+        self.assertEqual(records[-1]["t"], game.sim_time)
+        self.assertEqual(ticks[-1]["t"], game.sim_time)
+
+        tick = ticks[-1]
+        self.assertEqual(list(zip(tick["id"], tick["class"], tick["dir"], tick["blocked"],
+                                  tick["waiting"], tick["yielding"])), last)
+        self.assertAlmostEqual(tick["x"][0], game.vehicles[0].x, places=3)
+
+    def test_slow_writer_drops_ticks_not_events(self):
+        release = threading.Event()
+        pack = TelemetrySink._tick_block
+
+        def stalled(sink, ticks):
+            release.wait()
+            return pack(sink, ticks)
+
+        with patch.object(TelemetrySink, "_tick_block", stalled):
+            sink = TelemetrySink(self.path, chunk_ticks=10, max_chunks=1)
+            game = Game("cross", headless=True, seed=4)
+            sink.attach(game)
+            for _ in range(100):
+                game.update_playing(game.sim_dt)
+                sink.tick(game)
+            self.assertGreater(sink.dropped, 0)
+            release.set()
+            sink.close()
+
+        records = list(read_telemetry(self.path))
+        ticks = [r for r in records if r["type"] == "tick"]
+        dropped = sum(r["ticks"] for r in records if r["type"] == "dropped")
+        self.assertEqual(len(ticks) + sink.dropped, 100)
+        self.assertEqual(dropped, sink.dropped)
+
+    def test_stalled_writer_bounds_pending_events(self):
+        release = threading.Event()
+        pack = TelemetrySink._tick_block
+
+        def stalled(sink, ticks):
+            release.wait()
+            return pack(sink, ticks)
+
+        with patch.object(TelemetrySink, "_tick_block", stalled):
+            sink = TelemetrySink(self.path, chunk_ticks=10, max_chunks=1, max_events=4)
+            game = Game("cross", headless=True, seed=4)
+            sink.attach(game)
+            for _ in range(30):
+                game.controller.next_phase()
+                for _ in range(10):
+                    sink.tick(game)
+                self.assertLessEqual(sum(isinstance(e, dict) for e in sink._chunk), 4)
+            self.assertGreater(sink.dropped_events, 0)
+            release.set()
+            sink.close()
+
+        dropped = sum(r["events"] for r in read_telemetry(self.path) if r["type"] == "dropped")
+        self.assertEqual(dropped, sink.dropped_events)
+
+
+class TestDemand(unittest.TestCase):
+
+    def test_curve_interpolates_and_wraps(self):
+        curve = DemandCurve([(0.0, 1.0), (0.5, 3.0), (1.0, 1.0)], period=10.0)
+        self.assertEqual(curve(2.5), 2.0)
+        self.assertEqual(curve(5.0), 3.0)
+        self.assertEqual(curve(12.5), 2.0)
+        self.assertEqual(curve.peak, 3.0)
+
+    def test_poisson_arrival_rate(self):
+        game = Game("cross", headless=True, seed=3, demand=PoissonDemand({"N": 2.0, "W": 0.5}))
+        demand = game.demand
+        game.sim_time = 2000.0
+        counts = dict(demand.arrivals(game))
+        self.assertNotIn("S", counts)
+        self.assertAlmostEqual(counts["N"] / 2000.0, 2.0, delta=0.15)
+        self.assertAlmostEqual(counts["W"] / 2000.0, 0.5, delta=0.05)
+        self.assertGreater(demand.time_to_arrival(game), 0)
+
+    def test_emergency_ratios_override_factory(self):
+        game = Game("cross", headless=True, seed=1,
+                    demand=PoissonDemand(0.0, ambulance=0.0, police=1.0))
+        kinds = {type(game.spawn_vehicle(d)) for d in "NSWE"}
+        self.assertEqual(kinds, {PoliceCar})
+
+    def test_spawn_many_never_overlaps(self):
+        game = Game("cross", headless=True, seed=1, demand=PoissonDemand(0.0))
+        game.JAM_THRESHOLD = 10 ** 9
+        for d in "NSWE":
+            game.spawn_many(d, 6)
+        self.assertEqual(len(game.vehicles), 4)
+        self.assertEqual(game.backlog, 20)
+
+        for _ in range(1200):
+            game.update_playing(game.sim_dt)
+            for lane in game.lanes.lanes.values():
+                for a, b in zip(lane, list(lane)[1:]):
+                    self.assertFalse(overlaps(a.rect(), b.rect()))
+        self.assertEqual(game.backlog, 0)
+        self.assertIn(game.outcome, (None, "win"))
+
+    def test_zero_curve_never_arrives(self):
+        demand = PoissonDemand(1.0, DemandCurve([(0.0, 0.0), (1.0, 0.0)], period=60.0))
+        game = Game("cross", headless=True, seed=2, demand=demand)
+        self.assertEqual(demand.time_to_arrival(game), float("inf"))
+        game.sim_time = 600.0
+        self.assertEqual(demand.arrivals(game), [])
+
+    def test_queued_arrivals_count_toward_jam_only_when_held(self):
+        game = Game("cross", headless=True, seed=1, demand=PoissonDemand(0.0))
+        game.spawn_many("N", 4)
+        game.spawn_many("W", 4)
+        game.update_playing(game.sim_dt)
+        self.assertEqual(game.backlog, 6)
+        self.assertEqual(game.held_backlog(), 0)
+        self.assertIsNone(game.outcome)
+
+        # hold the vertical arms at red until the N queue reaches its spawn point
+        game = Game("cross", headless=True, seed=1, demand=PoissonDemand(0.0))
+        controller = game.controller
+        controller.phase_index = next(i for i, (v_state, _, _) in enumerate(controller.phases)
+                                      if isinstance(v_state, RedState))
+        controller._apply_phase()
+        controller.update = lambda dt: None
+        game.JAM_THRESHOLD = 10 ** 9
+        game.WIN_TIME = float("inf")
+        game.spawn_many("N", 20)
+        for _ in range(1200):
+            game.update_playing(game.sim_dt)
+        held = game.held_backlog()
+        self.assertGreater(held, 0)
+
+        game.JAM_THRESHOLD = game.lanes.waits.count + held
+        game.update_playing(game.sim_dt)
+        self.assertEqual(game.outcome, "jam")
+
+    def test_event_driven_matches_fixed_stepping(self):
+        def play(event_driven):
+            demand = PoissonDemand(0.4, DemandCurve.rush_hour(10.0), platoon_prob=0.4)
+            game = Game("cross", headless=True, seed=6, demand=demand)
+            scheduler = EventScheduler(game)
+            while not game.game_over:
+                if event_driven:
+                    scheduler.step(game.sim_dt)
+                else:
+                    game.update_playing(game.sim_dt)
+            return game.outcome, game.time_survived, [(type(v).__name__, v.x, v.y)
+                                                      for v in game.vehicles]
+
+        self.assertEqual(play(False), play(True))
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_stress_scenario_runs_without_ending(self):
+        game = build_scenario("cross", 200, priority_ratio=0.5)
+        self.assertEqual(len(game.vehicles), 200)
+        self.assertTrue(any(v.priority for v in game.vehicles))
+
+        for _ in range(30):
+            game.update_playing(game.sim_dt)
+        self.assertFalse(game.game_over)
+        self.assertEqual(len(game.vehicles), 200)
+
+    def test_regressions_are_flagged_above_threshold(self):
+        baseline = {"cross_10": {"update_playing": 1.0, "crash_detection": 1.0}}
+        results = {"cross_10": {"update_playing": 1.2, "crash_detection": 1.3},
+                   "t_turns": {"update_playing": 9.0}}
+        self.assertEqual(compare_to_baseline(results, baseline, 0.25),
+                         [("cross_10", "crash_detection", 1.0, 1.3)])
+
+
+class TestWorld(unittest.TestCase):
+
+    def test_vehicle_is_handed_to_the_neighbour(self):
+        world = World(1, 2, seed=0, spawn_prob=0.0)
+        left, right = world.cell(0, 0), world.cell(0, 1)
+        self.assertEqual(left.entries, ("N", "S", "W"))
+        self.assertEqual(right.entries, ("N", "S", "E"))
+
+        car = left.spawn_vehicle("W")
+        car.x = left.WIDTH + 79
+        car.passed_stop = True
+        world.step(0.1)
+
+        self.assertNotIn(car, left.vehicles)
+        self.assertIn(car, right.vehicles)
+        self.assertEqual((car.x, car.y), right.road.geometry.spawn["W"])
+        self.assertFalse(car.passed_stop)
+        self.assertEqual(world.handoffs, 1)
+
+    def test_seeded_world_is_deterministic_and_conserves_vehicles(self):
+        def run():
+            world = World(2, 2, seed=11, spawn_interval=0.4)
+            for _ in range(1500):
+                world.step(1 / 120)
+            positions = [[(v.x, v.y, v.direction) for v in cell.vehicles] for cell in world.cells]
+            return world.stats(), positions
+
+        stats, positions = run()
+        self.assertEqual(run(), (stats, positions))
+        self.assertGreater(stats["handoffs"], 0)
+        self.assertEqual(stats["spawned"], stats["vehicles"] + stats["queued"] + stats["exited"])
+
+    def test_handed_over_vehicle_waits_for_a_clear_entry(self):
+        world = World(1, 2, seed=0, spawn_prob=0.0)
+        left, right = world.cell(0, 0), world.cell(0, 1)
+        blocker = right.spawn_vehicle("W")
+
+        car = left.spawn_vehicle("W")
+        car.x = left.WIDTH + 79
+        car.passed_stop = True
+        world.step(0.1)
+
+        self.assertEqual(world.handoffs, 1)
+        self.assertNotIn(car, right.vehicles)
+        self.assertEqual(right.backlog, 1)
+        self.assertEqual(world.stats()["queued"], 1)
+
+        while right.backlog:
+            world.step(1 / 120)
+        self.assertIn(car, right.vehicles)
+        self.assertFalse(car.passed_stop)
+        self.assertGreaterEqual(blocker.x - car.x, right.SPAWN_GAP)
+
+    def test_parallel_stepping_matches_single_process(self):
+        world = World(3, 2, seed=7, spawn_interval=0.3)
+        with ParallelWorld(3, 2, seed=7, spawn_interval=0.3, workers=2) as parallel:
+            for _ in range(900):
+                world.step(1 / 120)
+                parallel.step(1 / 120)
+            self.assertEqual(parallel.snapshot(), world.snapshot())
+            self.assertEqual(parallel.stats(), world.stats())
+        self.assertGreater(world.handoffs, 0)
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestNumpyVehicleStore(unittest.TestCase):
+
+    def _trace(self, engine, template, seed, frames=600):
+        game = Game(template, headless=True, engine=engine, seed=seed)
+        game.spawn_interval = 0.25
+        game.spawn_prob = 0.9
+        game.JAM_THRESHOLD = 10 ** 9
+        game.WIN_TIME = float("inf")
+        game.collisions.first_collision = lambda vehicles, rects=None: None
+
+        frames_out = []
+        for _ in range(frames):
+            game.update_playing(1 / 60)
+            frames_out.append([
+                (type(v).__name__, v.x, v.y, v.direction,
+                 v.blocked, v._should_stop_cached, v.passed_stop)
+                for v in game.vehicles
+            ])
+        return frames_out
+
+    def test_matches_object_engine(self):
+        for template in ("cross", "t"):
+            for seed in range(2):
+                self.assertEqual(self._trace("object", template, seed),
+                                 self._trace("numpy", template, seed))
+
+    def test_rounds_with_collisions_match_object_engine(self):
+        def outcomes(engine):
+            game = Game("t", headless=True, engine=engine, seed=0)
+            game.spawn_interval = 0.4
+            game.spawn_prob = 0.9
+            result = []
+            for _ in range(3):
+                game.reset()
+                while not game.game_over:
+                    game.update_playing(game.sim_dt)
+                result.append((game.outcome, game.time_survived))
+            return result
+
+        result = outcomes("object")
+        self.assertIn("crash", [outcome for outcome, _ in result])
+        self.assertEqual(outcomes("numpy"), result)
+
+    def test_store_rects_match_vehicle_rects(self):
+        game = Game("cross", headless=True, engine="numpy", seed=4)
+        for d in "NSWE":
+            game.spawn_vehicle(d)
+        for v, x in zip(game.vehicles, (300.5, 451.9, -20.2, 880.0)):
+            v.x = x
+        bounds = (0, 0, 900, 400)
+        views, rects = game.store.rects(bounds)
+        inside = [v for v in game.vehicles if overlaps(v.rect(), bounds)]
+        self.assertEqual(views, inside)
+        self.assertEqual(rects, [v.rect() for v in inside])
+
+    def test_views_keep_vehicle_classes(self):
+        game = Game("cross", headless=True, engine="numpy")
+        v = game.spawn_vehicle("W")
+        self.assertIsInstance(v, (Car, Ambulance, PoliceCar))
+        self.assertEqual(v.direction, "W")
+
+        v.x = -500.0
+        game.update_playing(0.0)
+        self.assertNotIn(v, game.vehicles)
+        self.assertFalse(v.alive)
+        self.assertEqual(v.x, -500.0)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import os, sys
+sys.path.append(os.path.dirname(__file__))
+
+import unittest
+import pygame
+
+from road import Road
+from vehicles import Car, Ambulance, PoliceCar
+from main import Game
+from dirty_rects import DirtyRectRenderer
+from render import draw_vehicles, road_layer
+from text_cache import TextCache
+
+# the rendering layer's tests; test_logic stays free of pygame, like the
+# headless game it covers
+
+
+class TestRoadLayer(unittest.TestCase):
+
+    def test_static_layer_cached_per_template(self):
+        road = Road(900, 700, template="cross", bg_color=(30, 30, 30))
+        screen = pygame.Surface((900, 700))
+
+        layer = road_layer(road, screen)
+        self.assertIs(road_layer(road, screen), layer)
+        self.assertEqual(layer.get_at((5, 5))[:3], (30, 30, 30))
+        self.assertEqual(layer.get_at((road.center_x, 5))[:3], Road.LINE_COLOR)
+
+        road.template = "t"
+        t_layer = road_layer(road, screen)
+        self.assertIsNot(t_layer, layer)
+        self.assertEqual(t_layer.get_at((road.center_x, 5))[:3], (30, 30, 30))
+
+
+class TestDirtyRectRenderer(unittest.TestCase):
+
+    def test_matches_full_redraw(self):
+        pygame.font.init()
+        game = Game("cross", headless=True, seed=2)
+        game.font = pygame.font.Font(None, 26)
+        game.spawn_interval = 0.3
+        renderer = DirtyRectRenderer()
+
+        screen = pygame.Surface((game.WIDTH, game.HEIGHT))
+        reference = pygame.Surface((game.WIDTH, game.HEIGHT))
+
+        for _ in range(240):
+            game.update_playing(1 / 60)
+            renderer.draw(game, screen)
+            game.draw_playing(reference)
+            self.assertEqual(pygame.image.tobytes(screen, "RGB"),
+                             pygame.image.tobytes(reference, "RGB"))
+
+    def test_atlas_sprites_match_rounded_rects(self):
+        screen = pygame.Surface((300, 200))
+        reference = pygame.Surface((300, 200))
+        vehicles = [cls(40 + 70 * i, 50 + 90 * j, d)
+                    for i, cls in enumerate((Car, Ambulance, PoliceCar))
+                    for j, d in enumerate(("N", "E"))]
+        vehicles += [Car(250, 60, "S"), PoliceCar(250, 150, "W"), Car(5, 5, "W")]
+
+        draw_vehicles(screen, vehicles)
+        for v in vehicles:
+            pygame.draw.rect(reference, v.COLOR, v.draw_rect(), border_radius=4)
+        self.assertEqual(pygame.image.tobytes(screen, "RGB"),
+                         pygame.image.tobytes(reference, "RGB"))
+
+
+class TestTextCache(unittest.TestCase):
+
+    def test_hits_misses_and_lru_eviction(self):
+        pygame.font.init()
+        font = pygame.font.Font(None, 20)
+        cache = TextCache(maxsize=2)
+
+        a = cache.render(font, "a", True, (255, 255, 255))
+        self.assertIs(cache.render(font, "a", True, [255, 255, 255]), a)
+        cache.render(font, "b", True, (255, 255, 255))
+        cache.render(font, "a", True, (255, 255, 255))
+        cache.render(font, "c", True, (255, 255, 255))
+
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        self.assertEqual(len(cache), 2)
+        cache.render(font, "b", True, (255, 255, 255))
+        self.assertEqual(cache.misses, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
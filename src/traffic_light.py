@@ -1,10 +1,28 @@
 from __future__ import annotations
 
-import pygame
-
 from abc import ABC, abstractmethod
 
+
+OFF_COLOR = (50, 50, 50)
+LAMP_COLORS = ((200, 0, 0), (230, 230, 0), (0, 200, 0))
+
+
 class LightState(ABC):
+    # states are stateless, so every subclass is a shared singleton
+    CODE = -1
+    STOPS = False
+    LIT = ()
+
+    _instance = None
+
+    def __new__(cls):
+        instance = cls.__dict__.get("_instance")
+        if instance is None:
+            instance = super().__new__(cls)
+            instance.lamps = tuple(
+                color if i in cls.LIT else OFF_COLOR for i, color in enumerate(LAMP_COLORS))
+            cls._instance = instance
+        return instance
 
     @abstractmethod
     def next_state(self) -> "LightState":
@@ -20,6 +38,10 @@ class LightState(ABC):
 
 
 class RedState(LightState):
+    CODE = 0
+    STOPS = True
+    LIT = (0,)
+
     def next_state(self) -> LightState:
         return RedYellowState()
 
@@ -30,6 +52,9 @@ class RedState(LightState):
         return "RED"
 
 class GreenState(LightState):
+    CODE = 2
+    LIT = (2,)
+
     def next_state(self) -> LightState:
         return YellowState()
 
@@ -41,6 +66,9 @@ class GreenState(LightState):
 
 
 class YellowState(LightState):
+    CODE = 3
+    LIT = (1,)
+
     def next_state(self) -> LightState:
         return RedState()
 
@@ -51,6 +79,10 @@ class YellowState(LightState):
         return "YELLOW"
 
 class RedYellowState(LightState):
+    CODE = 1
+    STOPS = True
+    LIT = (0, 1)
+
     def next_state(self) -> LightState:
         return GreenState()
 
@@ -72,16 +104,38 @@ class TrafficLight:
         self._state: LightState = RedState()
         self._timer = 0.0
         self.cycle_time = cycle_time
+        self._listeners = []
+
+        if direction == "vertical":
+            w, h = 26, 70
+            self.lamp_positions = ((x, y - 18), (x, y), (x, y + 18))
+        else:
+            w, h = 70, 26
+            self.lamp_positions = ((x - 18, y), (x, y), (x + 18, y))
+        self.body_rect = (x - w // 2, y - h // 2, w, h)
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _changed(self):
+        for callback in self._listeners:
+            callback(self)
 
     def update(self, dt: float):
         self._timer += dt
         if self._timer >= self.cycle_time:
             self._timer = 0.0
             self._state = self._state.next_state()
+            self._changed()
 
     def switch_manual(self):
         self._timer = 0.0
         self._state = self._state.next_state()
+        self._changed()
+
+    @property
+    def state(self):
+        return self._state
 
     def current_color(self):
         return self._state.color()
@@ -92,53 +146,7 @@ class TrafficLight:
     def set_state(self, state):
         self._state = state
         self._timer = 0.0
+        self._changed()
 
-    def draw(self, screen):
-        if self.direction == "vertical":
-            w, h = 26, 70
-            lamp_positions = [
-                (self.x, self.y - 18),
-                (self.x, self.y),
-                (self.x, self.y + 18),
-            ]
-        else:
-            w, h = 70, 26
-            lamp_positions = [
-                (self.x - 18, self.y),
-                (self.x, self.y),
-                (self.x + 18, self.y),
-            ]
-
-        body_rect = (self.x - w // 2, self.y - h // 2, w, h)
-
-        pygame.draw.rect(screen, self.HOUSING_COLOR, body_rect, border_radius=6)
-        pygame.draw.rect(screen, self.OUTLINE_COLOR, body_rect, width=2, border_radius=6)
-
-        colors = {
-            "RED": (200, 0, 0),
-            "YELLOW": (230, 230, 0),
-            "GREEN": (0, 200, 0),
-        }
-        off_color = (50, 50, 50)
-
-        active = self.current_name()
-
-        glow = {
-            "RED": [0],
-            "RED_YELLOW": [0, 1],
-            "YELLOW": [1],
-            "GREEN": [2],
-        }
-
-        order = ["RED", "YELLOW", "GREEN"]
-
-        for i, name in enumerate(order):
-            pos = lamp_positions[i]
-
-            if i in glow[active]:
-                color = colors[name]
-            else:
-                color = off_color
-
-            pygame.draw.circle(screen, color, pos, 9)
-            pygame.draw.circle(screen, (10, 10, 10), pos, 9, 2)
\ No newline at end of file
+    def rect(self):
+        return self.body_rect
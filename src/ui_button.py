@@ -1,5 +1,7 @@
 import pygame
 
+from text_cache import render_text
+
 
 class Button:
     def __init__(self, rect, text, font, bg=(50, 50, 50), hover=(80, 80, 80), fg=(240, 240, 240)):
@@ -17,7 +19,7 @@ class Button:
         pygame.draw.rect(screen, color, self.rect, border_radius=10)
         pygame.draw.rect(screen, (15, 15, 15), self.rect, width=2, border_radius=10)
 
-        label = self.font.render(self.text, True, self.fg)
+        label = render_text(self.font, self.text, True, self.fg)
         label_rect = label.get_rect(center=self.rect.center)
         screen.blit(label, label_rect)
 
@@ -0,0 +1,401 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from vehicles import DIRECTIONS, DIR_CODE, FORWARD_ARM, VELOCITY, Vehicle
+
+
+DX = tuple(dx for dx, _ in VELOCITY)
+DY = tuple(dy for _, dy in VELOCITY)
+
+if np is not None:
+    SIGN = np.array([1.0, -1.0, 1.0, -1.0])
+    VERTICAL = np.array([True, True, False, False])
+    DX_TABLE = np.array(DX)
+    DY_TABLE = np.array(DY)
+
+YIELD_DIST = 90
+CULL_MARGIN = 80
+
+FIELDS = (
+    ("x", "f8"),
+    ("y", "f8"),
+    ("prev_x", "f8"),
+    ("prev_y", "f8"),
+    ("speed", "f8"),
+    ("half_len", "f8"),
+    ("width", "i4"),
+    ("length", "i4"),
+    ("dir", "i1"),
+    ("turn_target", "i1"),
+    ("blocked", "?"),
+    ("passed_stop", "?"),
+    ("stop", "?"),
+    ("priority", "?"),
+    ("alive", "?"),
+    ("turned", "?"),
+    ("turn_triggered", "?"),
+    ("waiting", "?"),
+    ("yielding", "?"),
+)
+
+VIEW_ATTRS = {
+    "x": "x",
+    "y": "y",
+    "prev_x": "prev_x",
+    "prev_y": "prev_y",
+    "dir": "dir",
+    "blocked": "blocked",
+    "passed_stop": "passed_stop",
+    "_should_stop_cached": "stop",
+    "yielding": "yielding",
+    "alive": "alive",
+    "turned": "turned",
+    "turn_triggered": "turn_triggered",
+}
+
+
+def _field_property(field):
+    def get(self):
+        return getattr(self._store, field)[self._slot].item()
+
+    def set(self, value):
+        getattr(self._store, field)[self._slot] = value
+
+    return property(get, set)
+
+
+def _turn_target_get(self):
+    code = self._store.turn_target[self._slot]
+    return None if code < 0 else DIRECTIONS[code]
+
+
+def _turn_target_set(self, value):
+    self._store.turn_target[self._slot] = -1 if value is None else DIR_CODE[value]
+
+
+# plain slots a view keeps on the object; everything else lives in the store
+OWN_ATTRS = tuple(
+    attr for attr in Vehicle.__slots__
+    if attr not in VIEW_ATTRS and attr != "turn_target_dir"
+)
+
+_view_classes = {}
+
+
+def view_class(cls):
+    view = _view_classes.get(cls)
+    if view is None:
+        namespace = {attr: _field_property(field) for attr, field in VIEW_ATTRS.items()}
+        namespace["turn_target_dir"] = property(_turn_target_get, _turn_target_set)
+        namespace["__slots__"] = ("_store", "_slot")
+        namespace["__module__"] = cls.__module__
+        view = type(cls.__name__, (cls,), namespace)
+        _view_classes[cls] = view
+    return view
+
+
+class VehicleStore:
+    def __init__(self, capacity=64):
+        if np is None:
+            raise RuntimeError("the numpy vehicle engine requires numpy to be installed")
+
+        self.capacity = capacity
+        self.size = 0
+        self.views = []
+        self.turns = []
+        self._geometry = None
+        self._geometry_tables = None
+        for name, dtype in FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, dtype in FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(self.capacity, dtype=dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, vehicle):
+        # copies `vehicle` into a new row and returns the view to use in its
+        # place; `vehicle` itself is left untouched and can be recycled
+        if self.size == self.capacity:
+            self._grow()
+
+        i = self.size
+        self.speed[i] = vehicle.SPEED
+        self.half_len[i] = vehicle.SIZE[1] / 2
+        self.width[i], self.length[i] = vehicle.SIZE
+        self.priority[i] = vehicle.priority
+        target = vehicle.turn_target_dir
+        self.turn_target[i] = -1 if target is None else DIR_CODE[target]
+        for attr, field in VIEW_ATTRS.items():
+            getattr(self, field)[i] = getattr(vehicle, attr)
+        self.waiting[i] = vehicle.is_waiting()
+
+        cls = view_class(type(vehicle))
+        view = cls.__new__(cls)
+        for attr in OWN_ATTRS:
+            setattr(view, attr, getattr(vehicle, attr))
+        view._store = self
+        view._slot = i
+
+        self.views.append(view)
+        self.size += 1
+        return view
+
+    def _detach(self, rows, views):
+        # views leaving the store keep their last state in a private copy of
+        # their rows, so they stay readable after removal
+        detached = VehicleStore.__new__(VehicleStore)
+        detached.capacity = detached.size = len(views)
+        for name, _ in FIELDS:
+            setattr(detached, name, getattr(self, name)[rows])
+        for slot, v in enumerate(views):
+            v._store = detached
+            v._slot = slot
+
+    def clear(self):
+        if self.size:
+            self._detach(np.arange(self.size), self.views)
+        self.views.clear()
+        self.size = 0
+
+    def cull(self):
+        n = self.size
+        alive = self.alive[:n]
+        if alive.all():
+            return []
+
+        keep = np.flatnonzero(alive)
+        gone = np.flatnonzero(~alive)
+        views = self.views
+        dead = [views[i] for i in gone.tolist()]
+        self._detach(gone, dead)
+
+        for name, _ in FIELDS:
+            arr = getattr(self, name)
+            arr[:len(keep)] = arr[keep]
+
+        survivors = [self.views[i] for i in keep]
+        for slot, v in enumerate(survivors):
+            v._slot = slot
+
+        self.views[:] = survivors
+        self.size = len(keep)
+        return dead
+
+    def waiting_changes(self):
+        n = self.size
+        now = self.blocked[:n] | self.stop[:n]
+        changed = np.flatnonzero(now != self.waiting[:n])
+        self.waiting[:n] = now
+        return [(self.views[i], bool(now[i])) for i in changed]
+
+    def snapshot(self):
+        n = self.size
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+
+    def rects(self, bounds):
+        # Vehicle.rect() for every vehicle overlapping `bounds`, in store
+        # order, as (views, rects) for CollisionGrid.first_collision
+        n = self.size
+        horizontal = ~VERTICAL[self.dir[:n]]
+        w = np.where(horizontal, self.length[:n], self.width[:n])
+        h = np.where(horizontal, self.width[:n], self.length[:n])
+        left = (self.x[:n] - w / 2).astype(int)
+        top = (self.y[:n] - h / 2).astype(int)
+
+        bx, by, bw, bh = bounds
+        rows = np.flatnonzero((left < bx + bw) & (bx < left + w) & (top < by + bh) & (by < top + h))
+        views = self.views
+        rects = zip(left[rows].tolist(), top[rows].tolist(), w[rows].tolist(), h[rows].tolist())
+        return [views[i] for i in rows.tolist()], list(rects)
+
+    def refresh_emergency(self, index):
+        # EmergencyIndex.refresh with the sort keys read from the arrays
+        for direction, lane in index.lanes.items():
+            if len(lane) > 1:
+                code = DIR_CODE[direction]
+                coord = self.y if VERTICAL[code] else self.x
+                rows = np.fromiter([v._slot for v in lane], dtype=np.intp, count=len(lane))
+                order = np.argsort(SIGN[code] * coord[rows], kind="stable")
+                lane[:] = [lane[i] for i in order.tolist()]
+
+    def update_following(self, lanes):
+        # LaneQueues.update_following over the store arrays: one gather per
+        # lane instead of reading each vehicle's position through its view
+        min_gap = lanes.MIN_GAP
+        for direction, lane in lanes.lanes.items():
+            n = len(lane)
+            if not n:
+                continue
+            code = DIR_CODE[direction]
+            coord = self.y if VERTICAL[code] else self.x
+
+            views = list(lane)
+            rows = np.fromiter([v._slot for v in views], dtype=np.intp, count=n)
+            delta = -np.diff(coord[rows])
+            if (SIGN[code] * delta < 0).any():
+                lanes._resort(direction)
+                views = list(lane)
+                rows = np.fromiter([v._slot for v in views], dtype=np.intp, count=n)
+                delta = -np.diff(coord[rows])
+
+            blocked = np.zeros(n, dtype=bool)
+            blocked[1:] = np.abs(delta) < min_gap
+            for i in np.flatnonzero(blocked != self.blocked[rows]).tolist():
+                lanes._set_blocked(views[i], blocked[i].item())
+
+    def _progress(self, rows):
+        d = self.dir[rows]
+        return SIGN[d] * np.where(VERTICAL[d], self.y[rows], self.x[rows]), d
+
+    def _should_yield(self, rows, prio_rows, pre):
+        hit = np.zeros(len(rows), dtype=bool)
+        if len(prio_rows) == 0 or len(rows) == 0:
+            return hit
+
+        q_prog, q_dir = self._progress(rows)
+        post = self._progress(prio_rows)
+
+        for (p_prog, p_dir), later in ((pre, True), (post, False)):
+            for k in range(4):
+                qm = np.flatnonzero(q_dir == k)
+                pm = p_dir == k
+                if len(qm) == 0 or not pm.any():
+                    continue
+
+                order = np.argsort(p_prog[pm], kind="stable")
+                sp = p_prog[pm][order]
+                si = prio_rows[pm][order]
+                qp = q_prog[qm]
+                qi = rows[qm]
+
+                lo = np.searchsorted(sp, qp, side="right")
+                hi = np.searchsorted(sp, qp + YIELD_DIST + 1.0, side="right")
+                for step in range(int((hi - lo).max(initial=0))):
+                    cand = lo + step
+                    valid = cand < hi
+                    c = np.where(valid, cand, 0)
+                    gap = sp[c] - qp
+                    owner = si[c] > qi if later else si[c] < qi
+                    hit[qm] |= valid & owner & (gap > 0) & (gap < YIELD_DIST)
+
+        return hit
+
+    def _turn(self, i, geo, rng):
+        d = int(self.dir[i])
+
+        if self.turn_target[i] < 0:
+            options = geo.turn_options[d]
+            if not options:
+                return
+
+            self.turn_target[i] = DIR_CODE[rng.choice(options)]
+            self.turned[i] = True
+
+        if SIGN[d] * (self.y[i] if VERTICAL[d] else self.x[i]) < geo.turn_at[d]:
+            return
+
+        new_dir = int(self.turn_target[i])
+        self.turns.append((self.views[i], DIRECTIONS[d]))
+        self.dir[i] = new_dir
+        self.turn_triggered[i] = True
+        self.turn_target[i] = -1
+
+        if VERTICAL[new_dir]:
+            self.x[i] = geo.lane_pos[new_dir]
+        else:
+            self.y[i] = geo.lane_pos[new_dir]
+
+    def _tables(self, geo):
+        if self._geometry is not geo:
+            self._geometry = geo
+            self._geometry_tables = (
+                np.array(geo.stop_at, dtype=float),
+                np.array(geo.pass_at, dtype=float),
+                np.array(geo.turn_at, dtype=float),
+                np.array([not geo.arms.get(arm, True) for arm in FORWARD_ARM]),
+            )
+        return self._geometry_tables
+
+    def update(self, dt, game):
+        self.turns = []
+        n = self.size
+        if n == 0:
+            return self.turns
+
+        x, y, d = self.x[:n], self.y[:n], self.dir[:n]
+        prio = self.priority[:n]
+        geo = game.road.geometry
+        stop_at, pass_at, turn_at, forward_missing = self._tables(geo)
+
+        red = np.array(game.controller.stops)[d]
+
+        sign = SIGN[d]
+        progress = sign * np.where(VERTICAL[d], y, x)
+
+        near_stop = progress + self.half_len[:n] >= stop_at[d]
+
+        active = ~self.blocked[:n]
+        should_stop = active & ~prio & ~self.passed_stop[:n] & red & near_stop
+        self.stop[:n][active] = should_stop[active]
+        self.yielding[:n][active] = False
+        movers = active & ~should_stop
+
+        untriggered = movers & ~self.turn_triggered[:n]
+        target = self.turn_target[:n]
+        at_center = progress >= turn_at[d]
+        special = untriggered & (
+            ((target < 0) & forward_missing[d]) | ((target >= 0) & at_center)
+        )
+
+        prio_rows = np.flatnonzero(prio)
+        pre = self._progress(prio_rows)
+
+        step = self.speed[:n] * dt
+        plain_prio = movers & prio & ~special
+        self._move(plain_prio, step)
+
+        moved = movers.copy()
+        for i in np.flatnonzero(special):
+            if not prio[i]:
+                row = np.array([i])
+                if self._should_yield(row, prio_rows, pre)[0]:
+                    self.stop[i] = True
+                    self.yielding[i] = True
+                    moved[i] = False
+                    continue
+
+            self._turn(i, geo, game.rng)
+            k = self.dir[i]
+            self.x[i] += DX[k] * step[i]
+            self.y[i] += DY[k] * step[i]
+
+        ordinary = np.flatnonzero(movers & ~prio & ~special)
+        yielding = ordinary[self._should_yield(ordinary, prio_rows, pre)]
+        self.stop[yielding] = True
+        self.yielding[yielding] = True
+        moved[yielding] = False
+        self._move(movers & ~prio & ~special & moved, step)
+
+        off_screen = (
+            (x < -CULL_MARGIN) | (x > game.WIDTH + CULL_MARGIN) |
+            (y < -CULL_MARGIN) | (y > game.HEIGHT + CULL_MARGIN)
+        )
+        self.alive[:n][moved & off_screen] = False
+
+        passed = SIGN[d] * np.where(VERTICAL[d], y, x) >= pass_at[d]
+        self.passed_stop[:n] |= moved & passed
+        return self.turns
+
+    def _move(self, mask, step):
+        n = self.size
+        d = self.dir[:n][mask]
+        s = step[mask]
+        self.x[:n][mask] += DX_TABLE[d] * s
+        self.y[:n][mask] += DY_TABLE[d] * s
@@ -1,149 +1,131 @@
-import random
-import pygame
+from itertools import count
 
 
 DIRECTIONS = ("N", "S", "W", "E")
+NORTH, SOUTH, WEST, EAST = range(4)
+DIR_CODE = {d: i for i, d in enumerate(DIRECTIONS)}
+
+VELOCITY = ((0.0, 1.0), (0.0, -1.0), (1.0, 0.0), (-1.0, 0.0))
+SIGN = (1, -1, 1, -1)
+FORWARD_ARM = ("S", "N", "E", "W")
 
 
 class Vehicle:
+    __slots__ = (
+        "uid", "x", "y", "prev_x", "prev_y", "dir", "alive", "blocked", "passed_stop",
+        "_should_stop_cached", "yielding", "turned", "turn_target_dir", "turn_triggered",
+        "_waits",
+    )
+
     COLOR = (30, 150, 230)
     SIZE = (22, 38)
     SPEED = 120
+    YIELD_DIST = 90
+    priority = False
+
+    # a fresh id per life, so pooled vehicles are told apart in telemetry
+    _uids = count(1)
 
     def __init__(self, x, y, direction):
+        self.uid = next(Vehicle._uids)
         self.x = float(x)
         self.y = float(y)
-        self.direction = direction
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.dir = DIR_CODE[direction]
         self.alive = True
+        self._waits = None
         self.blocked = False
         self.passed_stop = False
         self._should_stop_cached = False
+        self.yielding = False
         self.turned = False
-        self.priority = False
 
         self.turn_target_dir = None
         self.turn_triggered = False
 
+    @property
+    def direction(self):
+        return DIRECTIONS[self.dir]
+
+    @direction.setter
+    def direction(self, value):
+        self.dir = DIR_CODE[value]
+
     def rect(self):
         w, h = self.SIZE
-        if self.direction in ("W", "E"):
+        if self.dir >= WEST:
             w, h = h, w
-        return pygame.Rect(int(self.x - w/2), int(self.y - h/2), w, h)
+        return (int(self.x - w/2), int(self.y - h/2), w, h)
+
+    def draw_rect(self, alpha=1.0):
+        if alpha >= 1.0:
+            return self.rect()
+        w, h = self.SIZE
+        if self.dir >= WEST:
+            w, h = h, w
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        return (int(x - w/2), int(y - h/2), w, h)
 
     def update(self, dt, game):
         if self.blocked:
             return
 
-        self._should_stop_cached = self._should_stop(game)
-        if self._should_stop_cached:
-            return
-
-        if not self.priority and self._should_yield(game):
-            self._should_stop_cached = True
+        stopped = self._should_stop(game)
+        self.yielding = yielding = not stopped and not self.priority and self._should_yield(game)
+        stopped = stopped or yielding
+        if stopped != self._should_stop_cached:
+            self._should_stop_cached = stopped
+            if self._waits is not None:
+                self._waits.set_waiting(self, stopped)
+        if stopped:
             return
 
         self.try_turn_if_needed(game)
 
         v = self.SPEED * dt
-        if self.direction == "N":
-            self.y += v
-        elif self.direction == "S":
-            self.y -= v
-        elif self.direction == "W":
-            self.x += v
-        elif self.direction == "E":
-            self.x -= v
+        d = self.dir
+        dx, dy = VELOCITY[d]
+        self.x += dx * v
+        self.y += dy * v
 
         if (self.x < -80 or self.x > game.WIDTH + 80 or
             self.y < -80 or self.y > game.HEIGHT + 80):
             self.alive = False
 
-        road = game.road
-        cx, cy = road.center_x, road.center_y
-        off = road.stop_offset
-        margin = 2
-
         if not self.passed_stop:
-            if self.direction == "N":
-                if self.y >= (cy - off + margin):
-                    self.passed_stop = True
-            elif self.direction == "S":
-                if self.y <= (cy + off - margin):
-                    self.passed_stop = True
-            elif self.direction == "W":
-                if self.x >= (cx - off + margin):
-                    self.passed_stop = True
-            elif self.direction == "E":
-                if self.x <= (cx + off - margin):
-                    self.passed_stop = True
+            coord = self.y if d < WEST else self.x
+            if SIGN[d] * coord >= game.road.geometry.pass_at[d]:
+                self.passed_stop = True
 
     def try_turn_if_needed(self, game):
-        road = game.road
-        arms = road.arms()
-        cx, cy = road.center_x, road.center_y
-        lane = road.lane_width / 2
-
         if self.turn_triggered:
             return
 
+        geo = game.road.geometry
+        d = self.dir
         if self.turn_target_dir is None:
-            forward_arm = {
-                "N": "S",
-                "S": "N",
-                "W": "E",
-                "E": "W",
-            }[self.direction]
-
-            if arms.get(forward_arm, True):
-                return
-
-            options = []
-
-            if self.direction in ("N", "S"):
-                if arms.get("W"):
-                    options.append("E")
-                if arms.get("E"):
-                    options.append("W")
-            else:
-                if arms.get("N"):
-                    options.append("S")
-                if arms.get("S"):
-                    options.append("N")
-
+            options = geo.turn_options[d]
             if not options:
                 return
 
-            self.turn_target_dir = random.choice(options)
+            self.turn_target_dir = game.rng.choice(options)
             self.turned = True
 
-        if self.direction == "S":
-            if self.y > cy:
-                return
-        elif self.direction == "N":
-            if self.y < cy:
-                return
-        elif self.direction == "W":
-            if self.x < cx:
-                return
-        elif self.direction == "E":
-            if self.x > cx:
-                return
+        coord = self.y if d < WEST else self.x
+        if SIGN[d] * coord < geo.turn_at[d]:
+            return
 
-        new_dir = self.turn_target_dir
-        self.direction = new_dir
+        new_dir = DIR_CODE[self.turn_target_dir]
+        self.dir = new_dir
         self.turn_triggered = True
         self.turn_target_dir = None
 
-        if new_dir in ("W", "E"):
-            if new_dir == "W":
-                self.y = cy + lane
-            else:
-                self.y = cy - lane
+        if new_dir < WEST:
+            self.x = geo.lane_pos[new_dir]
         else:
-            if new_dir == "N":
-                self.x = cx - lane
-            else:
-                self.x = cx + lane
+            self.y = geo.lane_pos[new_dir]
 
     def _should_stop(self, game):
         if self.priority:
@@ -152,60 +134,15 @@ class Vehicle:
         if self.passed_stop:
             return False
 
-        road = game.road
-        cx, cy = road.center_x, road.center_y
-        off = road.stop_offset
-
-        group = "vertical" if self.direction in ("N", "S") else "horizontal"
-        light_state = game.controller.get_group_state(group)
-        red_like = light_state in ("RED", "RED_YELLOW")
-
-        if not red_like:
+        d = self.dir
+        if not game.controller.stops[d]:
             return False
 
-        stop_margin = 10
-
-        if self.direction == "N":
-            stop_y = cy - off
-            return self.y + self.SIZE[1]/2 >= stop_y - stop_margin
-
-        if self.direction == "S":
-            stop_y = cy + off
-            return self.y - self.SIZE[1]/2 <= stop_y + stop_margin
-
-        if self.direction == "W":
-            stop_x = cx - off
-            return self.x + self.SIZE[1]/2 >= stop_x - stop_margin
-
-        if self.direction == "E":
-            stop_x = cx + off
-            return self.x - self.SIZE[1]/2 <= stop_x + stop_margin
-
-        return False
+        coord = self.y if d < WEST else self.x
+        return SIGN[d] * coord + self.SIZE[1]/2 >= game.road.geometry.stop_at[d]
 
     def _should_yield(self, game):
-        YIELD_DIST = 90
-
-        for other in game.vehicles:
-            if not other.priority:
-                continue
-            if other.direction != self.direction:
-                continue
-
-            if self.direction == "N":
-                if other.y > self.y and (other.y - self.y) < YIELD_DIST:
-                    return True
-            elif self.direction == "S":
-                if other.y < self.y and (self.y - other.y) < YIELD_DIST:
-                    return True
-            elif self.direction == "W":
-                if other.x > self.x and (other.x - self.x) < YIELD_DIST:
-                    return True
-            elif self.direction == "E":
-                if other.x < self.x and (self.x - other.x) < YIELD_DIST:
-                    return True
-
-        return False
+        return game.lanes.emergency.has_ahead(self, self.YIELD_DIST)
 
 
     def is_waiting(self):
@@ -213,58 +150,54 @@ class Vehicle:
         return self.blocked or self._should_stop_cached
 
 
-    def draw(self, screen):
-        pygame.draw.rect(screen, self.COLOR, self.rect(), border_radius=4)
-
-
 class Car(Vehicle):
+    __slots__ = ()
     COLOR = (40, 170, 240)
     SPEED = 140
 
 class Ambulance(Vehicle):
+    __slots__ = ()
     COLOR = (255, 255, 255)
     SPEED = 200
-
-    def __init__(self, x, y, direction):
-        super().__init__(x, y, direction)
-        self.priority = True
+    priority = True
 
 
 class PoliceCar(Vehicle):
+    __slots__ = ()
     COLOR = (40, 90, 255)
     SPEED = 190
+    priority = True
 
-    def __init__(self, x, y, direction):
-        super().__init__(x, y, direction)
-        self.priority = True
 
 class VehicleFactory:
-
-    @staticmethod
-    def create(direction, game):
-        road = game.road
-        cx, cy = road.center_x, road.center_y
-        lane = road.lane_width / 2
-
-        if direction == "N":
-            x = cx - lane
-            y = -50
-        elif direction == "S":
-            x = cx + lane
-            y = game.HEIGHT + 50
-        elif direction == "W":
-            x = -50
-            y = cy + lane
-        elif direction == "E":
-            x = game.WIDTH + 50
-            y = cy - lane
-        else:
-            x, y = cx, cy
-
-        r = random.random()
-        if r < 0.08:
-            return Ambulance(x, y, direction)
-        elif r < 0.14:
-            return PoliceCar(x, y, direction)
-        else:
-            return Car(x, y, direction)
\ No newline at end of file
+    # one factory per simulation (a Game, or a World and all its cells):
+    # released vehicles are only handed back out by the factory that
+    # recycled them, so independent games never share vehicle objects
+    MAX_FREE = 256
+    # cumulative thresholds on one rng draw; anything above is a Car
+    MIX = ((0.08, Ambulance), (0.14, PoliceCar))
+
+    def __init__(self):
+        self._free = {}
+
+    def release(self, vehicle):
+        free = self._free.setdefault(type(vehicle), [])
+        if len(free) < self.MAX_FREE:
+            free.append(vehicle)
+
+    def build(self, kind, x, y, direction):
+        free = self._free.get(kind)
+        if free:
+            vehicle = free.pop()
+            vehicle.__init__(x, y, direction)
+            return vehicle
+        return kind(x, y, direction)
+
+    def create(self, direction, game, mix=None):
+        x, y = game.road.geometry.spawn[direction]
+
+        r = game.rng.random()
+        for threshold, kind in mix or self.MIX:
+            if r < threshold:
+                return self.build(kind, x, y, direction)
+        return self.build(Car, x, y, direction)
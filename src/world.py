@@ -0,0 +1,199 @@
+import argparse
+import random
+import time
+
+from collision import CollisionGrid
+from controller import IntersectionController, STRATEGIES
+from intersection import Intersection
+from lanes import LaneQueues
+from road import Road
+from vehicles import DIRECTIONS, VehicleFactory
+
+
+# heading -> (row, col) step to the cell a vehicle drives into
+NEIGHBOUR_STEP = {"N": (1, 0), "S": (-1, 0), "W": (0, 1), "E": (0, -1)}
+
+
+class Cell(Intersection):
+    WIDTH = 600
+    HEIGHT = 600
+
+    def __init__(self, row, col, template, seed, entries=DIRECTIONS,
+                 spawn_interval=1.0, spawn_prob=0.7, phase_timings=None, controller="fixed",
+                 factory=None):
+        self.row = row
+        self.col = col
+        self.road = Road(self.WIDTH, self.HEIGHT, template=template)
+        self.collisions = CollisionGrid(self.road.intersection_rect())
+        self.controller = IntersectionController.for_road(self.road, STRATEGIES[controller]())
+        if phase_timings is not None:
+            self.controller.set_timings(*phase_timings)
+        self.lights = self.controller.lights
+
+        self.rng = random.Random(seed)
+        self.lanes = LaneQueues()
+        self.controller.sensors = self.lanes
+        self.vehicles = []
+        self.factory = factory if factory is not None else VehicleFactory()
+        self.sim_time = 0.0
+
+        arms = self.road.geometry.arms
+        self.entries = tuple(d for d in entries if arms[d])
+        self.spawn_interval = spawn_interval
+        self.spawn_prob = spawn_prob
+        self.spawn_timer = 0.0
+        # vehicles handed over by a neighbour wait here until their arm's
+        # spawn point is clear
+        self.init_backlog()
+
+        self.spawned = 0
+        self.crashes = 0
+        self._last_crash = None
+
+    def spawn_vehicle(self, direction):
+        v = super().spawn_vehicle(direction)
+        self.spawned += 1
+        return v
+
+    def step(self, dt):
+        leaving = self.step_traffic(dt)
+
+        crash = self.first_collision()
+        if crash is not None and crash != self._last_crash:
+            self.crashes += 1
+        self._last_crash = crash
+
+        return leaving
+
+
+def cell_layout(rows, cols, seed=None):
+    # (row, col, seed, entries) for every cell of a grid in row-major order;
+    # the per-cell seeds come off one stream, so any subset of the cells can
+    # be built exactly as the whole world would build them
+    seeds = random.Random(seed)
+    for row in range(rows):
+        for col in range(cols):
+            entries = [d for d, (dr, dc) in NEIGHBOUR_STEP.items()
+                       if not (0 <= row - dr < rows and 0 <= col - dc < cols)]
+            yield row, col, seeds.getrandbits(64), entries
+
+
+class World:
+    def __init__(self, rows, cols, template="cross", seed=None,
+                 spawn_interval=1.0, spawn_prob=0.7, phase_timings=None, controller="fixed"):
+        self.rows = rows
+        self.cols = cols
+        # the cells hand vehicles to each other, so they share one pool
+        self.factory = VehicleFactory()
+
+        self.cells = [
+            Cell(row, col, template, cell_seed, entries, spawn_interval, spawn_prob,
+                 phase_timings, controller, self.factory)
+            for row, col, cell_seed, entries in cell_layout(rows, cols, seed)
+        ]
+
+        self.time = 0.0
+        self.handoffs = 0
+        self.exited = 0
+
+    def _inside(self, row, col):
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+    def cell(self, row, col):
+        return self.cells[row * self.cols + col]
+
+    def neighbour(self, cell, direction):
+        dr, dc = NEIGHBOUR_STEP[direction]
+        row, col = cell.row + dr, cell.col + dc
+        if not self._inside(row, col):
+            return None
+        return self.cell(row, col)
+
+    def deliver(self, cell, leaving):
+        for v in leaving:
+            target = self.neighbour(cell, v.direction)
+            if target is not None and target.road.geometry.arms[v.direction]:
+                target.enter(v)
+                self.handoffs += 1
+            else:
+                self.factory.release(v)
+                self.exited += 1
+
+    def step(self, dt):
+        # every cell steps against its own state first, then vehicles that
+        # left a cell are handed to the neighbour in a fixed order, so the
+        # result does not depend on the order cells are stepped in
+        outgoing = [cell.step(dt) for cell in self.cells]
+        for cell, leaving in zip(self.cells, outgoing):
+            if leaving:
+                self.deliver(cell, leaving)
+        self.time += dt
+
+    def vehicle_count(self):
+        return sum(len(cell.vehicles) for cell in self.cells)
+
+    def stats(self):
+        return {
+            "cells": len(self.cells),
+            "sim_time": self.time,
+            "vehicles": self.vehicle_count(),
+            "queued": sum(cell.backlog for cell in self.cells),
+            "spawned": sum(cell.spawned for cell in self.cells),
+            "handoffs": self.handoffs,
+            "exited": self.exited,
+            "crashes": sum(cell.crashes for cell in self.cells),
+            "waiting": sum(cell.lanes.waits.count for cell in self.cells),
+        }
+
+    def snapshot(self):
+        return [[(type(v).__name__, v.x, v.y, v.direction) for v in cell.vehicles]
+                for cell in self.cells]
+
+    def run(self, seconds, dt=1 / 120):
+        steps = round(seconds / dt)
+        vehicle_steps = 0
+
+        start = time.perf_counter()
+        for _ in range(steps):
+            vehicle_steps += self.vehicle_count()
+            self.step(dt)
+        wall = time.perf_counter() - start
+
+        stats = self.stats()
+        stats.update({
+            "steps": steps,
+            "wall_time": wall,
+            "steps_per_sec": steps / wall if wall else float("inf"),
+            "vehicle_steps_per_sec": vehicle_steps / wall if wall else float("inf"),
+            "speedup": seconds / wall if wall else float("inf"),
+        })
+        return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless multi-intersection grid simulation")
+    parser.add_argument("--rows", type=int, default=4)
+    parser.add_argument("--cols", type=int, default=4)
+    parser.add_argument("--template", choices=("cross", "t"), default="cross")
+    parser.add_argument("--seconds", type=float, default=30.0, help="simulated seconds")
+    parser.add_argument("--dt", type=float, default=1 / 120, help="fixed simulation step")
+    parser.add_argument("--spawn-interval", type=float, default=1.0)
+    parser.add_argument("--spawn-prob", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--controller", default="fixed", choices=sorted(STRATEGIES))
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    world = World(args.rows, args.cols, args.template, seed=args.seed,
+                  spawn_interval=args.spawn_interval, spawn_prob=args.spawn_prob,
+                  controller=args.controller)
+    stats = world.run(args.seconds, args.dt)
+    print(f"{stats['cells']} intersections, {stats['sim_time']:.1f}s simulated "
+          f"in {stats['wall_time']:.2f}s ({stats['speedup']:.1f}x real time)")
+    print(f"vehicles live {stats['vehicles']}, queued {stats['queued']}, "
+          f"spawned {stats['spawned']}, handoffs {stats['handoffs']}, "
+          f"exited {stats['exited']}, crashes {stats['crashes']}")
+    print(f"{stats['steps_per_sec']:.0f} steps/s, "
+          f"{stats['vehicle_steps_per_sec']:.0f} vehicle updates/s")